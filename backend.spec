@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['backend', 'backend.state', 'backend.llm', 'backend.csv_handler', 'backend.metadata', 'backend.analysis', 'backend.commands'],
+    hiddenimports=['backend', 'backend.state', 'backend.storage', 'backend.dataset_cache', 'backend.chunked_store', 'backend.dtype_optimizer', 'backend.session', 'backend.aggregates', 'backend.profiling', 'backend.sketches', 'backend.kvstore', 'backend.query_cache', 'backend.similarity', 'backend.sandbox', 'backend.code_optimizer', 'backend.llm', 'backend.csv_handler', 'backend.metadata', 'backend.analysis', 'backend.commands'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
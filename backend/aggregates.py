@@ -0,0 +1,110 @@
+"""Time-bucket aggregate cube over a dataset's primary date.
+
+Row counts and primary-money sums are grouped by day once per dataset. Period metrics are
+then answered from the buckets instead of re-filtering every row.
+"""
+import pandas as pd
+from backend.state import get_derived, set_derived
+from backend.metadata import clean_numeric, numeric_column
+
+def _cube_columns(metadata: dict, columns) -> tuple[str | None, str | None]:
+    """(date, money) columns from metadata that exist in the dataset."""
+    date_col = metadata.get("primary_date")
+    money_col = metadata.get("primary_money")
+    return (
+        date_col if date_col in columns else None,
+        money_col if money_col in columns else None,
+    )
+
+
+def _bucket(dates: pd.Series, money: pd.Series | None) -> dict:
+    """Daily count/money buckets plus dataset totals for one frame."""
+    frame = pd.DataFrame({"day": pd.to_datetime(dates, errors="coerce").dt.normalize()})
+    frame["money"] = money.to_numpy() if money is not None else 0.0
+    daily = frame.groupby("day").agg(count=("money", "size"), money=("money", "sum"))
+    return {
+        "daily": daily,
+        "total_count": int(len(frame)),
+        "total_money": float(frame["money"].sum()),
+    }
+
+
+def _merge(parts: list[dict]) -> dict:
+    """Combine per-chunk buckets into one cube."""
+    daily = pd.concat([p["daily"] for p in parts]).groupby(level=0).sum()
+    return {
+        "daily": daily,
+        "total_count": sum(p["total_count"] for p in parts),
+        "total_money": sum(p["total_money"] for p in parts),
+    }
+
+
+def _finish(cube: dict, date_col: str, money_col: str | None) -> dict:
+    daily = cube["daily"]
+    cube["monthly"] = daily.groupby([daily.index.year, daily.index.month]).sum()
+    cube["monthly"].index.names = ["year", "month"]
+    cube.update(date_col=date_col, money_col=money_col)
+    return cube
+
+
+def build_cube(df: pd.DataFrame, metadata: dict) -> dict | None:
+    """Aggregate an in-memory dataset into day/month buckets (None without a primary date)."""
+    date_col, money_col = _cube_columns(metadata, df.columns)
+    if date_col is None:
+        return None
+    cube = _bucket(df[date_col], numeric_column(df, money_col) if money_col else None)
+    return _finish(cube, date_col, money_col)
+
+
+def build_cube_chunked(store, metadata: dict) -> dict | None:
+    """build_cube for an out-of-core ChunkedDataset, one chunk at a time."""
+    date_col, money_col = _cube_columns(metadata, store.columns)
+    if date_col is None:
+        return None
+    columns = [c for c in (date_col, money_col) if c]
+    parts = [
+        _bucket(chunk[date_col], clean_numeric(chunk[money_col]) if money_col else None)
+        for chunk in store.iter_chunks(columns=columns)
+    ]
+    if not parts:
+        return None
+    return _finish(_merge(parts), date_col, money_col)
+
+
+def get_cube(data, metadata: dict) -> dict | None:
+    """Aggregate cube for the active DataFrame or ChunkedDataset, built on first use."""
+    if data is None or not metadata:
+        return None
+    key = ("cube",) + _cube_columns(metadata, data.columns)
+    cube = get_derived(data, key)
+    if cube is None:
+        if isinstance(data, pd.DataFrame):
+            cube = build_cube(data, metadata)
+        else:
+            cube = build_cube_chunked(data, metadata)
+        if cube is None:
+            return None
+        set_derived(data, key, cube)
+    return cube
+
+
+def period_totals(cube: dict, month: int, year: int) -> tuple[int, float]:
+    """(row count, money sum) for a month; the whole dataset if the month has no rows."""
+    monthly = cube["monthly"]
+    if (year, month) in monthly.index:
+        bucket = monthly.loc[(year, month)]
+        if bucket["count"] > 0:
+            return int(bucket["count"]), float(bucket["money"])
+    return cube["total_count"], cube["total_money"]
+
+
+def period_series(cube: dict, freq: str, end: pd.Timestamp, periods: int) -> pd.DataFrame:
+    """count/money per period for the `periods` periods ending with the one containing end.
+
+    Periods without rows are included with zeros.
+    """
+    daily = cube["daily"]
+    grouped = daily.groupby(daily.index.to_period(freq)).sum()
+    end_period = end.to_period(freq)
+    index = pd.period_range(end=end_period, periods=periods, freq=freq)
+    return grouped.reindex(index, fill_value=0)
@@ -1,27 +1,88 @@
 """Analysis functions."""
+import sys
 import json
 import re
 import ast
 import textwrap
 from datetime import datetime, timedelta
 import pandas as pd
-import numpy as np
-from backend.state import get_dataframe
+from backend.state import get_dataframe, get_store, memoize
+from backend.chunked_store import ChunkedDataset, referenced_columns
+from backend.metadata import clean_numeric, numeric_column
+from backend.aggregates import get_cube, period_totals, period_series
 from backend.bots import BOT_DEFINITIONS, normalize_bot_id
-
-
-def run_analysis(query: str, df: pd.DataFrame, llm, metadata: dict, bot_id: str | None = None) -> str:
-    """Run analysis on a query using LLM."""
+from backend.sandbox import build_scope, execute, dataset_handle, run_code, SandboxUnavailable
+from backend.code_optimizer import (
+    SLOW_CODE_SECONDS,
+    optimize_code,
+    lint_code,
+    estimate_seconds,
+    slow_code_message,
+)
+from backend.query_cache import (
+    code_scope,
+    get_cached_code,
+    find_similar_code,
+    put_cached_code,
+    drop_cached_code,
+)
+
+
+def run_analysis(
+    query: str,
+    df: pd.DataFrame,
+    llm,
+    metadata: dict,
+    bot_id: str | None = None,
+    on_chunk=None,
+    refresh: bool = False,
+) -> str:
+    """Run analysis on a query using LLM.
+
+    If on_chunk is given, the explanation is streamed and on_chunk is called with each
+    text fragment as it arrives; the full answer is still returned at the end.
+
+    Code that answered the same query for a dataset with the same schema before is
+    reused, skipping the plan (and fix) LLM calls; if it fails on this data the normal
+    flow runs. refresh=True ignores the cached code.
+
+    Generated code is vectorised where that is exactly equivalent, and code estimated to
+    be slow on this many rows is sent back to the LLM with the reasons.
+
+    df may also be an out-of-core ChunkedDataset; the generated code then runs against
+    only the columns it references, loaded from the store.
+    """
     # Use ensure_ascii=False to preserve Hebrew/Unicode characters in column names
     rich_context = json.dumps(
         [{item["col"]: item["rich_desc"]} for item in metadata.get("catalog", [])],
         ensure_ascii=False
     )
+    # Load-time dtype optimisation turns money/date text into typed columns; tell the LLM
+    # so generated code does not try string cleaning on them.
+    if isinstance(df, ChunkedDataset):
+        column_types = {
+            col: "numeric" if df.summary[col]["numeric"] else "text" for col in df.columns
+        }
+    else:
+        column_types = {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+    column_types = json.dumps(column_types, ensure_ascii=False)
+
+    # Pre-aggregated buckets let simple trend questions skip a full scan of df.
+    cube = get_cube(df, metadata)
+    totals_note = ""
+    if cube is not None:
+        money_label = cube["money_col"] or "money (none)"
+        totals_note = (
+            f"\nPRE-AGGREGATED: 'monthly_totals' (columns year, month, count, money) and "
+            f"'daily_totals' (columns day, count, money) hold row counts and sums of "
+            f"{money_label} by {cube['date_col']}; prefer them for per-period totals."
+        )
 
     plan_prompt = f"""
 You are a Strategic Data Analyst.
 INDUSTRY: {metadata.get('industry')}
 COLUMN CONTEXT: {rich_context}
+COLUMN TYPES: {column_types}
 QUERY: {query}
 
 RULES:
@@ -29,6 +90,9 @@ RULES:
 2. Use 'pd' and 'np'.
 3. If calculating duration: pd.to_datetime() first.
 4. Store result in variable 'result'.
+5. For amounts stored as text, use num('column') (cleaned float Series aligned with df) instead of string cleaning.
+6. Use vectorised column operations; avoid iterrows, apply(..., axis=1) and Python loops over rows.
+{totals_note}
 
 Return ONLY JSON: {{"plan": "logic", "python_code": "code"}}
 """
@@ -60,60 +124,84 @@ Return ONLY JSON: {{"plan": "logic", "python_code": "code"}}
         """Parse Python to catch syntax errors early (e.g., unexpected indent)."""
         ast.parse(code, filename="<analysis_code>", mode="exec")
 
-    exec_scope = {
-        "df": df,
-        "pd": pd,
-        "np": np,
-        "datetime": datetime,
-        "timedelta": timedelta,
-    }
+    def num(column: str) -> pd.Series:
+        """Cleaned float values of a (possibly text) numeric column, aligned with df."""
+        if isinstance(df, ChunkedDataset):
+            return clean_numeric(exec_scope["df"][column])
+        return numeric_column(df, column)
 
-    # Provide a small set of safe builtins for basic operations.
-    exec_scope["__builtins__"] = {
-        "len": len,
-        "sum": sum,
-        "min": min,
-        "max": max,
-        "sorted": sorted,
-        "round": round,
-        "abs": abs,
-        "range": range,
-        "enumerate": enumerate,
-        "list": list,
-        "dict": dict,
-        "set": set,
-        "tuple": tuple,
-        "float": float,
-        "int": int,
-        "str": str,
-        "bool": bool,
+    extras = {
+        "monthly_totals": cube["monthly"].reset_index() if cube is not None else None,
+        "daily_totals": cube["daily"].reset_index() if cube is not None else None,
     }
+    # Shallow copy: generated code may add or overwrite columns without touching
+    # the loaded dataset (or the cleaned columns cached for it).
+    exec_scope = build_scope(
+        df if isinstance(df, ChunkedDataset) else df.copy(deep=False), num, extras
+    )
+    # Generated code normally runs in a worker process with time and memory limits.
+    handle = dataset_handle(df)
 
     # Plan + execute with self-healing retries on codegen failures.
+    def _run(code: str) -> None:
+        """Execute validated code; it must set `result` (stored in exec_scope)."""
+        if handle is not None:
+            exec_scope["result"] = run_code(handle, code, extras)
+            return
+        if isinstance(df, ChunkedDataset):
+            exec_scope["df"] = df.read(columns=referenced_columns(code, df.columns))
+        execute(code, exec_scope)
+
+    scope = code_scope(df)
+    succeeded_code = None
+    cached_code = similar = None
+    if not refresh:
+        cached_code = get_cached_code(scope, query)
+        if cached_code is None:
+            cached_code = similar = find_similar_code(scope, query)
+    if cached_code is not None:
+        try:
+            code = _sanitize_python(cached_code)
+            _validate_python(code)
+            _run(code)
+            succeeded_code = code
+            if similar is not None:
+                put_cached_code(scope, query, code)
+        except SandboxUnavailable:
+            raise
+        except Exception:
+            # Same schema, different data (e.g. a value the code relied on is gone).
+            if similar is None:
+                drop_cached_code(scope, query)
+
     max_attempts = 3
+    row_count = df.num_rows if isinstance(df, ChunkedDataset) else len(df)
     last_exc: Exception | None = None
     last_code: str | None = None
 
-    for attempt in range(max_attempts):
-        try:
-            if attempt == 0:
-                plan_res = llm.invoke(plan_prompt).content
-                plan_json = _extract_json(plan_res)
-                python_code = plan_json.get("python_code", "")
-            else:
-                exc = last_exc or RuntimeError("unknown execution error")
-                fix_prompt = f"""
+    if succeeded_code is None:
+        for attempt in range(max_attempts):
+            try:
+                if attempt == 0:
+                    plan_res = llm.invoke(plan_prompt).content
+                    plan_json = _extract_json(plan_res)
+                    python_code = plan_json.get("python_code", "")
+                else:
+                    exc = last_exc or RuntimeError("unknown execution error")
+                    fix_prompt = f"""
 You are fixing LLM-generated Python that is executed with:
 - df (pandas DataFrame)
 - pd (pandas)
 - np (numpy)
 - datetime, timedelta
+- num('column') (cleaned float values of a text amount column, aligned with df)
 
 The previous code FAILED during execution.
 
 USER QUERY: {query}
 INDUSTRY: {metadata.get('industry')}
 COLUMN CONTEXT: {rich_context}
+COLUMN TYPES: {column_types}
 
 ERROR TYPE: {type(exc).__name__}
 ERROR MESSAGE: {str(exc)}
@@ -124,31 +212,45 @@ PREVIOUS CODE:
 RULES:
 1. Do NOT import anything.
 2. Do NOT define functions/classes.
-3. ONLY use df/pd/np/datetime/timedelta.
+3. ONLY use df/pd/np/datetime/timedelta/num.
 4. MUST assign the final answer to a variable named result.
-5. Return ONLY JSON: {{"python_code": "..."}} (no markdown, no backticks).
+5. Use vectorised column operations; avoid iterrows, apply(..., axis=1) and loops over rows.
+6. Return ONLY JSON: {{"python_code": "..."}} (no markdown, no backticks).
 """.strip()
-                fix_res = llm.invoke(fix_prompt).content
-                fix_json = _extract_json(fix_res)
-                python_code = fix_json.get("python_code", "")
-
-            code = _sanitize_python(python_code)
-            _validate_python(code)
-            last_code = code
-
-            # IMPORTANT: use exec_scope as BOTH globals and locals so that
-            # names like pd/np remain visible even if the code defines lambdas/functions.
-            exec(code, exec_scope, exec_scope)
-
-            if "result" not in exec_scope:
-                raise RuntimeError("Generated code did not set `result`.")
-
-            break
-        except Exception as e:
-            last_exc = e
-            # Try again with an error-aware fix prompt
-            continue
-    else:
+                    fix_res = llm.invoke(fix_prompt).content
+                    fix_json = _extract_json(fix_res)
+                    python_code = fix_json.get("python_code", "")
+
+                code = _sanitize_python(python_code)
+                _validate_python(code)
+                code, rewrites = optimize_code(code)
+                if rewrites:
+                    print(
+                        f"Optimised generated code: {'; '.join(rewrites)}",
+                        file=sys.stderr,
+                        flush=True,
+                    )
+                last_code = code
+
+                # Send code that would crawl through a large dataset back for a rewrite
+                # (the last attempt runs regardless, bounded by the sandbox timeout).
+                issues = lint_code(code, row_count)
+                if attempt < max_attempts - 1 and estimate_seconds(issues) > SLOW_CODE_SECONDS:
+                    raise RuntimeError(slow_code_message(issues, row_count))
+
+                _run(code)
+                succeeded_code = code
+                put_cached_code(scope, query, code)
+                break
+            except SandboxUnavailable:
+                # No worker to run on: retrying with a fixed-up prompt would not help.
+                raise
+            except Exception as e:
+                last_exc = e
+                # Try again with an error-aware fix prompt
+                continue
+
+    if succeeded_code is None:
         # Exhausted retries
         exc = last_exc or RuntimeError("unknown execution error")
         raise RuntimeError(
@@ -164,58 +266,162 @@ RULES:
         query=query,
         industry=metadata.get("industry"),
     )
-    return llm.invoke(explain_prompt).content
+    if on_chunk is None:
+        return llm.invoke(explain_prompt).content
+
+    parts = []
+    for chunk in llm.stream(explain_prompt):
+        text = chunk.content
+        if not text:
+            continue
+        if not isinstance(text, str):
+            text = str(text)
+        parts.append(text)
+        on_chunk(text)
+    return "".join(parts)
+
+
+def _report_date() -> datetime:
+    """Last date the dashboard reports on: today from the 10th, else the end of last month."""
+    # Dashboard (10th Day Rule) - same logic as app.py
+    today = datetime.now()
+    return today if today.day >= 10 else today.replace(day=1) - timedelta(days=1)
+
+
+def _target_period() -> tuple[int, int]:
+    """(month, year) the dashboard reports on: this month from the 10th, else last month."""
+    report_date = _report_date()
+    return report_date.month, report_date.year
+
+
+def _money_sum(col: pd.Series) -> float:
+    """Sum a money column, stripping currency symbols/separators from text values."""
+    return float(clean_numeric(col).sum())
 
 
 def get_metrics(metadata: dict) -> dict:
-    """Calculate metrics from the dataframe and metadata."""
+    """Calculate metrics from the dataframe and metadata.
+
+    With a primary date the figures come from the dataset's time-bucket cube (built once,
+    then O(buckets) per call); results are memoised until the dataset or metadata changes.
+    """
+    return memoize(
+        "metrics",
+        lambda: _compute_metrics(metadata),
+        _target_period(),
+        metadata.get("primary_date"),
+        metadata.get("primary_money"),
+    )
+
+
+def _compute_metrics(metadata: dict) -> dict:
     df = get_dataframe()
     if df is None:
+        store = get_store()
+        if store is not None:
+            return get_metrics_chunked(store, metadata)
         raise ValueError("No dataset loaded. Please load a CSV file first.")
-    
-    # Dashboard (10th Day Rule) - same logic as app.py
-    today = datetime.now()
-    target_m, target_y = (
-        (today.month, today.year)
-        if today.day >= 10
-        else (
-            (today.replace(day=1) - timedelta(days=1)).month,
-            (today.replace(day=1) - timedelta(days=1)).year,
-        )
-    )
 
-    df_metrics = df
-    if metadata.get("primary_date") and metadata["primary_date"] in df.columns:
-        df_metrics = df[
-            (df[metadata["primary_date"]].dt.month == target_m)
-            & (df[metadata["primary_date"]].dt.year == target_y)
-        ]
-        if df_metrics.empty:
-            df_metrics = df
-
-    # Calculate revenue
-    revenue = 0.0
-    if metadata.get("primary_money") and metadata["primary_money"] in df_metrics.columns:
-        col = metadata["primary_money"]
-        if df_metrics[col].dtype == "object":
-            revenue = (
-                df_metrics[col]
-                .astype(str)
-                .str.replace(r"[^\d.]", "", regex=True)
-                .astype(float)
-                .sum()
-            )
-        else:
-            revenue = float(df_metrics[col].sum())
-
-    # Calculate volume (row count)
-    volume = int(len(df_metrics))
+    target_m, target_y = _target_period()
+
+    cube = get_cube(df, metadata)
+    if cube is not None:
+        volume, revenue = period_totals(cube, target_m, target_y)
+    else:
+        # Calculate revenue (the cleaned money column is cached across dashboard refreshes)
+        revenue = 0.0
+        if metadata.get("primary_money") and metadata["primary_money"] in df.columns:
+            revenue = float(numeric_column(df, metadata["primary_money"]).sum())
+
+        # Calculate volume (row count)
+        volume = int(len(df))
 
     # Calculate average value
     avg_value = revenue / volume if volume > 0 else 0.0
 
     return {
         "revenue": float(revenue),
-        "volume": volume,
+        "volume": int(volume),
+        "avgValue": float(avg_value),
+    }
+
+
+def get_metrics_chunked(store, metadata: dict) -> dict:
+    """get_metrics for an out-of-core ChunkedDataset (cube, or one pass over the money column)."""
+    target_m, target_y = _target_period()
+    money_col = metadata.get("primary_money")
+
+    cube = get_cube(store, metadata)
+    if cube is not None:
+        volume, revenue = period_totals(cube, target_m, target_y)
+    else:
+        volume, revenue = store.num_rows, 0.0
+        if money_col and money_col in store.columns:
+            for chunk in store.iter_chunks(columns=[money_col]):
+                revenue += _money_sum(chunk[money_col])
+
+    avg_value = revenue / volume if volume > 0 else 0.0
+    return {
+        "revenue": float(revenue),
+        "volume": int(volume),
         "avgValue": float(avg_value),
     }
+
+
+# get_metrics_series granularity -> pandas period frequency.
+SERIES_GRANULARITIES = {
+    "day": "D",
+    "week": "W",
+    "month": "M",
+    "quarter": "Q",
+    "year": "Y",
+}
+
+
+def get_metrics_series(metadata: dict, granularity: str = "month", periods: int = 12) -> list[dict]:
+    """Revenue/volume/average for the last `periods` periods up to the reported one.
+
+    Uses the same money parsing and 10th-day rule as get_metrics; the series is one
+    groupby over the dataset's daily buckets.
+    """
+    return memoize(
+        "metrics_series",
+        lambda: _compute_metrics_series(metadata, granularity, periods),
+        str(granularity).lower(),
+        periods,
+        _report_date().date(),
+        metadata.get("primary_date"),
+        metadata.get("primary_money"),
+    )
+
+
+def _compute_metrics_series(metadata: dict, granularity: str, periods: int) -> list[dict]:
+    freq = SERIES_GRANULARITIES.get(str(granularity).lower())
+    if freq is None:
+        raise ValueError(
+            f"Unsupported granularity: {granularity}. Use one of: {', '.join(SERIES_GRANULARITIES)}."
+        )
+    if periods < 1:
+        raise ValueError("The number of periods must be at least 1.")
+
+    data = get_dataframe()
+    if data is None:
+        data = get_store()
+    if data is None:
+        raise ValueError("No dataset loaded. Please load a CSV file first.")
+
+    cube = get_cube(data, metadata)
+    if cube is None:
+        raise ValueError("Trend metrics need a date column. Please generate metadata first.")
+
+    series = period_series(cube, freq, pd.Timestamp(_report_date()), periods)
+    return [
+        {
+            "period": str(period),
+            "start": period.start_time.strftime("%Y-%m-%d"),
+            "revenue": float(row["money"]),
+            "volume": int(row["count"]),
+            "avgValue": float(row["money"] / row["count"]) if row["count"] > 0 else 0.0,
+        }
+        for period, row in series.iterrows()
+    ]
@@ -0,0 +1,334 @@
+"""Out-of-core dataset storage for CSVs larger than memory.
+
+The CSV is read in chunks and each chunk is written to its own Parquet part file; only a
+ChunkedDataset handle plus per-column summary statistics stay resident. Consumers either
+stream the parts (iter_chunks) or load just the columns they need (read).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+from typing import Iterator
+import pandas as pd
+from backend.storage import get_data_dir, write_frame, read_frame
+from backend.sketches import (
+    SKETCHES_ENABLED,
+    build_column_sketches,
+    merge_column_sketches,
+    sketches_from_dict,
+    sketches_to_dict,
+)
+
+# Files at least this large are ingested chunk-wise by load_file (BACKEND_CHUNKED_THRESHOLD_MB).
+CHUNKED_THRESHOLD_BYTES = int(os.environ.get("BACKEND_CHUNKED_THRESHOLD_MB", "1024")) * 1024 * 1024
+
+# Rows per chunk / Parquet part (BACKEND_CHUNK_ROWS).
+CHUNK_ROWS = int(os.environ.get("BACKEND_CHUNK_ROWS", "250000"))
+
+# Total size of chunk stores on disk; least recently used ones are evicted beyond it
+# (BACKEND_CHUNKED_CACHE_MB). Stores of registered datasets are never evicted.
+CHUNKED_CACHE_MAX_BYTES = int(os.environ.get("BACKEND_CHUNKED_CACHE_MB", "10240")) * 1024 * 1024
+
+# Incomplete stores (no manifest) older than this are left over from failed ingestions.
+STALE_STORE_SECONDS = 24 * 3600
+
+MANIFEST_NAME = "manifest.json"
+
+
+class ChunkedDataset:
+    """Handle to a dataset stored on disk as a directory of Parquet parts."""
+
+    def __init__(self, path: str, manifest: dict):
+        self.path = path
+        self.manifest = manifest
+        # Columns converted with pd.to_datetime whenever chunks are read
+        # (the in-memory equivalent of the primary_date preprocessing step).
+        self.date_columns: list[str] = []
+
+    @property
+    def columns(self) -> list[str]:
+        return self.manifest["columns"]
+
+    @property
+    def num_rows(self) -> int:
+        return self.manifest["num_rows"]
+
+    @property
+    def summary(self) -> dict:
+        """Per-column summary: non_null, and sum/min/max for numeric columns."""
+        return self.manifest["summary"]
+
+    def sketches(self, column: str) -> dict:
+        """Distinct-count/quantile sketches built for a column at ingestion (may be empty)."""
+        return sketches_from_dict(self.manifest.get("sketches", {}).get(column, {}))
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.num_rows, len(self.columns)
+
+    def _prepare(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        for col in self.date_columns:
+            if col in chunk.columns:
+                chunk[col] = pd.to_datetime(chunk[col], errors="coerce")
+        return chunk
+
+    def iter_chunks(self, columns: list[str] | None = None) -> Iterator[pd.DataFrame]:
+        """Yield the dataset part by part, optionally only some columns."""
+        for part in self.manifest["parts"]:
+            yield self._prepare(read_frame(os.path.join(self.path, part), columns=columns))
+
+    def read(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """Materialise the dataset (or just the given columns) in memory."""
+        frames = list(self.iter_chunks(columns))
+        if not frames:
+            return pd.DataFrame(columns=columns or self.columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def head(self, n: int = 1000) -> pd.DataFrame:
+        """First n rows, reading as few parts as possible."""
+        frames, remaining = [], n
+        for chunk in self.iter_chunks():
+            frames.append(chunk.head(remaining))
+            remaining -= len(frames[-1])
+            if remaining <= 0:
+                break
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=self.columns)
+
+
+def referenced_columns(code: str, columns: list[str]) -> list[str]:
+    """Dataset columns whose names appear in code, in dataset order.
+
+    Used to load only the columns generated analysis code can touch; falls back to all
+    columns when none are mentioned explicitly (e.g. code that uses df.describe()).
+    """
+    used = [col for col in columns if f"'{col}'" in code or f'"{col}"' in code]
+    return used or list(columns)
+
+
+def _store_dir(path: str) -> str:
+    """Store directory for a source file, keyed by its path, size and modification time."""
+    stat = os.stat(path)
+    key = hashlib.blake2b(
+        f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8"),
+        digest_size=16,
+    ).hexdigest()
+    return os.path.join(get_data_dir("chunked"), key)
+
+
+class _KindChanged(Exception):
+    """Columns turned out to hold text after earlier parts were stored as numbers."""
+
+    def __init__(self, columns: set[str]):
+        super().__init__(", ".join(sorted(columns)))
+        self.columns = columns
+
+
+def _clean_column(name) -> str:
+    """Column name clean-up shared with the in-memory loader."""
+    return str(name).strip().replace(" ", "_")
+
+
+def _conform(chunk: pd.DataFrame, numeric: dict[str, bool | None], first: bool) -> pd.DataFrame:
+    """Coerce a chunk to the column kinds decided so far, deciding undecided ones.
+
+    A column is undecided (None) while it has only been empty. Raises _KindChanged for
+    columns stored as numbers so far whose values in this chunk do not parse as numbers,
+    so their text is never replaced by NaN.
+    """
+    changed = set()
+    for col, is_numeric in numeric.items():
+        series = chunk[col]
+        if is_numeric is None:
+            if series.notna().any():
+                is_numeric = bool(pd.api.types.is_numeric_dtype(series))
+                numeric[col] = is_numeric
+                if not is_numeric and not first:
+                    # Earlier (all-empty) parts were stored as float columns.
+                    changed.add(col)
+            continue
+        if is_numeric and not pd.api.types.is_numeric_dtype(series):
+            parsed = pd.to_numeric(series, errors="coerce")
+            if (parsed.isna() & series.notna()).any():
+                changed.add(col)
+            else:
+                chunk[col] = parsed
+        elif not is_numeric and pd.api.types.is_numeric_dtype(series):
+            chunk[col] = series.astype(str).where(series.notna())
+    if changed:
+        raise _KindChanged(changed)
+    return chunk
+
+
+def _update_summary(summary: dict, chunk: pd.DataFrame) -> None:
+    """Fold one chunk into the running per-column summary."""
+    for col in chunk.columns:
+        series = chunk[col]
+        entry = summary[col]
+        entry["non_null"] += int(series.notna().sum())
+        if entry["numeric"] and len(series.dropna()) > 0:
+            entry["sum"] += float(series.sum())
+            lo, hi = float(series.min()), float(series.max())
+            entry["min"] = lo if entry["min"] is None else min(entry["min"], lo)
+            entry["max"] = hi if entry["max"] is None else max(entry["max"], hi)
+
+
+def open_chunked_dataset(store_path: str) -> ChunkedDataset | None:
+    """Open a complete chunk store, or return None if it is missing or unreadable."""
+    manifest_path = os.path.join(store_path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return ChunkedDataset(store_path, json.load(f))
+    except Exception as e:
+        print(f"Ignoring unreadable chunk store {store_path}: {e}", file=sys.stderr, flush=True)
+        return None
+
+
+def _dir_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def evict_stores(max_bytes: int, keep: set[str]) -> None:
+    """Delete least recently used chunk stores until they fit in max_bytes.
+
+    Stores whose paths are in keep (those of loaded datasets) are never deleted, and
+    incomplete ones only once they are stale (a newer one may still be being written).
+    """
+    root = get_data_dir("chunked")
+    keep = {os.path.abspath(path) for path in keep}
+    now = time.time()
+    entries = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.abspath(path) in keep:
+            continue
+        manifest_path = os.path.join(path, MANIFEST_NAME)
+        try:
+            if not os.path.exists(manifest_path):
+                if now - os.stat(path).st_mtime > STALE_STORE_SECONDS:
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            entries.append((os.stat(manifest_path).st_mtime, _dir_size(path), path))
+        except OSError:
+            continue
+
+    total = sum(size for _, size, _ in entries) + sum(
+        _dir_size(path) for path in keep if os.path.isdir(path)
+    )
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def ingest_csv_chunked(path: str, read_params: dict) -> ChunkedDataset:
+    """Stream a CSV from disk into a Parquet part store and return its handle.
+
+    read_params are the pd.read_csv keyword arguments (encoding, separator, engine...).
+    A store built from the same unchanged file is reused instead of re-ingesting.
+
+    Column kinds are decided by the first chunk with values. If a later chunk shows that
+    a column stored as numbers holds text, the file is read again with that column as
+    text rather than losing the values that do not parse.
+    """
+    store_path = _store_dir(path)
+    existing = open_chunked_dataset(store_path)
+    if existing is not None:
+        # Touch the manifest: its modification time is the LRU clock used by evict_stores.
+        os.utime(os.path.join(store_path, MANIFEST_NAME))
+        return existing
+
+    os.makedirs(store_path, exist_ok=True)
+    text_columns: set[str] = set()
+    while True:
+        try:
+            manifest = _write_parts(path, read_params, store_path, text_columns)
+            break
+        except _KindChanged as e:
+            print(
+                f"Re-reading {os.path.basename(path)}: text found in columns {e} "
+                "after the first chunk",
+                file=sys.stderr,
+                flush=True,
+            )
+            text_columns |= e.columns
+
+    # The manifest is written last: a store without one is incomplete and gets rebuilt.
+    with open(os.path.join(store_path, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    return ChunkedDataset(store_path, manifest)
+
+
+def _write_parts(path: str, read_params: dict, store_path: str, text_columns: set[str]) -> dict:
+    """One ingestion pass: write the parts and return the manifest (raises _KindChanged)."""
+    columns: list[str] | None = None
+    numeric: dict[str, bool | None] = {}
+    summary: dict[str, dict] = {}
+    sketches: dict[str, dict] = {}
+    parts: list[str] = []
+    num_rows = 0
+
+    params = dict(read_params)
+    if text_columns:
+        # read_csv dtype keys are the raw header names, before the clean-up below.
+        header = pd.read_csv(path, nrows=0, **read_params).columns
+        dtype = dict(params.get("dtype") or {})
+        dtype.update(
+            {raw: str for raw in header if _clean_column(raw) in text_columns}
+        )
+        params["dtype"] = dtype
+
+    reader = pd.read_csv(path, chunksize=CHUNK_ROWS, **params)
+    for index, chunk in enumerate(reader):
+        # Same column clean-up as the in-memory loader.
+        chunk.columns = [_clean_column(col) for col in chunk.columns]
+        if columns is None:
+            columns = list(chunk.columns)
+            # Empty columns stay undecided (None) until a chunk has values for them.
+            numeric = {col: False if col in text_columns else None for col in columns}
+            summary = {
+                col: {"numeric": None, "non_null": 0, "sum": 0.0, "min": None, "max": None}
+                for col in columns
+            }
+        chunk = _conform(chunk, numeric, first=index == 0)
+        for col in columns:
+            if numeric[col] is not None:
+                summary[col]["numeric"] = numeric[col]
+
+        part = f"part-{index:05d}.parquet"
+        write_frame(chunk, os.path.join(store_path, part))
+        _update_summary(summary, chunk)
+        if SKETCHES_ENABLED:
+            # Mergeable sketches let approximate statistics skip re-reading the parts.
+            for col in columns:
+                merge_column_sketches(
+                    sketches.setdefault(col, {}),
+                    build_column_sketches(chunk[col], chunk[col] if numeric[col] else None),
+                )
+        parts.append(part)
+        num_rows += len(chunk)
+
+    if not parts:
+        raise ValueError(
+            "The CSV file appears to be empty or could not be parsed. "
+            "Please ensure the file contains data and is in a valid CSV format."
+        )
+
+    for col in columns:
+        if summary[col]["numeric"] is None:
+            # Empty throughout: a float column, as in the in-memory loader.
+            summary[col]["numeric"] = True
+
+    return {
+        "source": os.path.abspath(path),
+        "columns": columns,
+        "num_rows": num_rows,
+        "summary": summary,
+        "parts": parts,
+        "sketches": {col: sketches_to_dict(col_sketches) for col, col_sketches in sketches.items()},
+        "read_params": {k: v for k, v in read_params.items() if isinstance(v, (str, int, bool))},
+    }
@@ -0,0 +1,375 @@
+"""Static performance checks and safe rewrites for LLM-generated pandas code.
+
+optimize_code rewrites patterns with an exact vectorised equivalent:
+- df.apply(lambda r: <arithmetic on r['col']>, axis=1) becomes the same arithmetic on
+  whole columns;
+- repeated pd.to_datetime(df['col']) calls on an unchanged column are parsed once.
+
+lint_code reports the slow patterns that remain (iterrows, row-wise apply, Python loops
+over rows, elementwise lambdas, repeated date parsing) with a rough runtime estimate for
+the dataset's row count, so slow code can be sent back to the LLM before it runs.
+"""
+import os
+import ast
+
+# Code estimated to run longer than this is sent back for a rewrite (BACKEND_SLOW_CODE_SECONDS).
+SLOW_CODE_SECONDS = float(os.environ.get("BACKEND_SLOW_CODE_SECONDS", "10"))
+
+# Rough per-row cost of each pattern, in seconds.
+PER_ROW_SECONDS = {
+    "iterrows": 2e-5,
+    "itertuples": 2e-6,
+    "apply_rows": 1e-5,
+    "row_loop": 1e-5,
+    "apply_elementwise": 5e-7,
+    "to_datetime": 1e-6,
+}
+
+ADVICE = {
+    "iterrows": "iterrows() loops over rows in Python; use vectorised column operations.",
+    "itertuples": "itertuples() loops over rows in Python; use vectorised column operations.",
+    "apply_rows": "apply(..., axis=1) calls Python once per row; combine whole columns instead.",
+    "row_loop": "a Python loop over rows; use vectorised column operations or groupby.",
+    "apply_elementwise": "apply/map with a lambda calls Python once per value; use .str/.dt "
+    "accessors, np.where or arithmetic on the column.",
+    "to_datetime": "the same column is parsed with pd.to_datetime more than once; parse it once.",
+}
+
+_VECTOR_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div)
+
+# Name of the dataset in generated code; only work on it scales with the row count.
+DATASET_NAME = "df"
+
+# Methods whose result is small (or per group) rather than one value per row.
+_REDUCING_METHODS = {
+    "groupby", "resample", "rolling", "head", "tail", "nlargest", "nsmallest", "sample",
+    "value_counts", "unique", "agg", "aggregate", "sum", "mean", "describe", "pivot_table",
+    "drop_duplicates",
+}
+
+# DataFrame methods that change the frame they are called on.
+_MUTATING_METHODS = {"pop", "insert", "update"}
+
+
+def _column_name(node) -> str | None:
+    """'c' for a subscript like x['c']."""
+    if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant):
+        if isinstance(node.slice.value, str):
+            return node.slice.value
+    return None
+
+
+def _root_name(node) -> str | None:
+    """Name at the start of an attribute/subscript chain (df for df.loc[...])."""
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _is_row_axis(call: ast.Call) -> bool:
+    return any(
+        kw.arg == "axis" and isinstance(kw.value, ast.Constant) and kw.value.value in (1, "columns")
+        for kw in call.keywords
+    )
+
+
+def _vectorisable(node, param: str) -> bool:
+    """True if node is arithmetic/comparisons on row[<column>] values and constants."""
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, (int, float)) and not isinstance(node.value, bool)
+    if isinstance(node, ast.Subscript):
+        return (
+            isinstance(node.value, ast.Name)
+            and node.value.id == param
+            and _column_name(node) is not None
+        )
+    if isinstance(node, ast.BinOp):
+        return (
+            isinstance(node.op, _VECTOR_OPS)
+            and _vectorisable(node.left, param)
+            and _vectorisable(node.right, param)
+        )
+    if isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, (ast.USub, ast.UAdd)) and _vectorisable(node.operand, param)
+    if isinstance(node, ast.Compare):
+        return len(node.ops) == 1 and all(
+            _vectorisable(part, param) for part in (node.left, node.comparators[0])
+        )
+    return False
+
+
+class _RowApplyRewriter(ast.NodeTransformer):
+    """frame.apply(lambda r: r['a'] * r['b'], axis=1) -> frame['a'] * frame['b']."""
+
+    def __init__(self):
+        self.rewritten = 0
+
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        func = node.func
+        if not (
+            isinstance(func, ast.Attribute)
+            and func.attr == "apply"
+            and isinstance(func.value, ast.Name)
+            and len(node.args) == 1
+            and isinstance(node.args[0], ast.Lambda)
+            and _is_row_axis(node)
+            and all(kw.arg == "axis" for kw in node.keywords)
+        ):
+            return node
+        fn = node.args[0]
+        if len(fn.args.args) != 1 or fn.args.vararg or fn.args.kwarg or fn.args.kwonlyargs:
+            return node
+        param = fn.args.args[0].arg
+        body = fn.body
+        uses_column = any(
+            isinstance(n, ast.Subscript) and _column_name(n) for n in ast.walk(body)
+        )
+        if not uses_column or not _vectorisable(body, param):
+            return node
+        frame = func.value.id
+
+        class _Columns(ast.NodeTransformer):
+            def visit_Subscript(self, sub):
+                if isinstance(sub.value, ast.Name) and sub.value.id == param:
+                    return ast.Subscript(
+                        value=ast.Name(id=frame, ctx=ast.Load()), slice=sub.slice, ctx=ast.Load()
+                    )
+                return sub
+
+        self.rewritten += 1
+        return _Columns().visit(body)
+
+
+def _parents(tree) -> dict:
+    return {child: parent for parent in ast.walk(tree) for child in ast.iter_child_nodes(parent)}
+
+
+def _in_nested_scope(node, parents) -> bool:
+    scopes = (ast.Lambda, ast.FunctionDef, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+    while node in parents:
+        node = parents[node]
+        if isinstance(node, scopes):
+            return True
+    return False
+
+
+def _is_conditional(node, parents, tree) -> bool:
+    """True if node sits in a branch, loop or short-circuit within its top-level statement."""
+    branches = (ast.If, ast.IfExp, ast.BoolOp, ast.Try, ast.For, ast.While, ast.With)
+    while parents.get(node) is not tree:
+        node = parents[node]
+        if isinstance(node, branches):
+            return True
+    return False
+
+
+def _to_datetime_calls(tree) -> dict[str, list[ast.Call]]:
+    """pd.to_datetime(frame['col'], ...) calls grouped by their exact source."""
+    groups: dict[str, list[ast.Call]] = {}
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr == "to_datetime"
+            and isinstance(node.func.value, ast.Name)
+            and node.func.value.id == "pd"
+            and node.args
+            and isinstance(node.args[0], ast.Subscript)
+            and isinstance(node.args[0].value, ast.Name)
+            and _column_name(node.args[0]) is not None
+        ):
+            groups.setdefault(ast.dump(node), []).append(node)
+    return groups
+
+
+def _changes_column(stmt, frame: str, column: str, call_dump: str) -> bool:
+    """True if stmt may change frame[column] (other than assigning it the same parse)."""
+    for node in ast.walk(stmt):
+        targets = []
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, (ast.AugAssign, ast.AnnAssign)):
+            targets = [node.target]
+        elif isinstance(node, (ast.For, ast.With)):
+            targets = [getattr(node, "target", None)]
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            if _root_name(node.func.value) == frame and (
+                node.func.attr in _MUTATING_METHODS
+                or any(kw.arg == "inplace" for kw in node.keywords)
+            ):
+                return True
+        for target in targets:
+            for t in ast.walk(target) if target is not None else ():
+                if isinstance(t, ast.Name) and t.id == frame and isinstance(t.ctx, ast.Store):
+                    return True
+                if isinstance(t, ast.Subscript) and _root_name(t) == frame:
+                    name = _column_name(t)
+                    if name is not None and name != column and isinstance(t.value, ast.Name):
+                        continue
+                    if (
+                        name == column
+                        and isinstance(node, ast.Assign)
+                        and ast.dump(node.value) == call_dump
+                    ):
+                        continue
+                    return True
+    return False
+
+
+def _hoist_to_datetime(tree: ast.Module) -> int:
+    """Parse each repeatedly converted, unchanged column once; returns hoisted calls."""
+    parents = _parents(tree)
+    used = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)}
+    hoisted = 0
+    for call_dump, calls in _to_datetime_calls(tree).items():
+        if len(calls) < 2 or any(_in_nested_scope(c, parents) for c in calls):
+            continue
+        frame, column = calls[0].args[0].value.id, _column_name(calls[0].args[0])
+
+        def top_index(node):
+            while parents.get(node) is not tree:
+                node = parents[node]
+            return tree.body.index(node)
+
+        first = min(top_index(c) for c in calls)
+        # Parsing earlier must not run code the original only ran conditionally.
+        if not any(
+            top_index(c) == first and not _is_conditional(c, parents, tree) for c in calls
+        ):
+            continue
+        if any(_changes_column(s, frame, column, call_dump) for s in tree.body[first:]):
+            continue
+        base = "_dates_" + "".join(ch if ch.isalnum() else "_" for ch in column)
+        name, n = base, 1
+        while name in used:
+            n += 1
+            name = f"{base}{n}"
+        used.add(name)
+        assign = ast.Assign(
+            targets=[ast.Name(id=name, ctx=ast.Store())], value=calls[0], lineno=0
+        )
+        for call in calls:
+            parent = parents[call]
+            for field, value in ast.iter_fields(parent):
+                if value is call:
+                    setattr(parent, field, ast.Name(id=name, ctx=ast.Load()))
+                elif isinstance(value, list):
+                    value[:] = [ast.Name(id=name, ctx=ast.Load()) if v is call else v for v in value]
+        tree.body.insert(first, assign)
+        parents = _parents(tree)
+        hoisted += 1
+    return hoisted
+
+
+def optimize_code(code: str) -> tuple[str, list[str]]:
+    """Apply the safe vectorising rewrites; returns (code, descriptions of the rewrites).
+
+    Code without applicable patterns is returned unchanged (comments and layout kept).
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code, []
+    applied = []
+    rows = _RowApplyRewriter()
+    tree = rows.visit(tree)
+    if rows.rewritten:
+        applied.append(f"vectorised {rows.rewritten} row-wise apply call(s)")
+    hoisted = _hoist_to_datetime(tree)
+    if hoisted:
+        applied.append(f"parsed {hoisted} date column(s) once instead of repeatedly")
+    if not applied:
+        return code, []
+    return ast.unparse(ast.fix_missing_locations(tree)), applied
+
+
+def _on_dataset(node) -> bool:
+    """True if node is df, or a column/row-preserving expression of it (not a grouping
+    or a small slice such as head())."""
+    while True:
+        if isinstance(node, ast.Name):
+            return node.id == DATASET_NAME
+        if isinstance(node, ast.Call):
+            node = node.func
+        elif isinstance(node, ast.Attribute):
+            if node.attr in _REDUCING_METHODS:
+                return False
+            node = node.value
+        elif isinstance(node, ast.Subscript):
+            node = node.value
+        else:
+            return False
+
+
+def _is_row_iter(node) -> bool:
+    """Loop iterables that walk every row of df: range(len(df)), df.index, df['col'], zip(...)."""
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        if node.func.id == "range" and len(node.args) == 1:
+            arg = node.args[0]
+            return (
+                isinstance(arg, ast.Call)
+                and isinstance(arg.func, ast.Name)
+                and arg.func.id == "len"
+                and len(arg.args) == 1
+                and _on_dataset(arg.args[0])
+            )
+        if node.func.id in ("zip", "enumerate"):
+            return any(_is_row_iter(a) for a in node.args)
+        return False
+    if isinstance(node, ast.Attribute) and node.attr in ("index", "values"):
+        return _on_dataset(node.value)
+    return _column_name(node) is not None and _on_dataset(node)
+
+
+def lint_code(code: str, rows: int) -> list[dict]:
+    """Slow patterns in code: [{"line", "pattern", "message", "seconds"}]."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    issues = []
+
+    def add(node, pattern: str, count: int = 1) -> None:
+        issues.append({
+            "line": getattr(node, "lineno", None),
+            "pattern": pattern,
+            "message": ADVICE[pattern],
+            "seconds": PER_ROW_SECONDS[pattern] * rows * count,
+        })
+
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and _on_dataset(node.func.value)
+        ):
+            attr = node.func.attr
+            if attr in ("iterrows", "itertuples"):
+                add(node, attr)
+            elif attr == "apply" and _is_row_axis(node):
+                add(node, "apply_rows")
+            elif attr in ("apply", "map") and any(isinstance(a, ast.Lambda) for a in node.args):
+                add(node, "apply_elementwise")
+        elif isinstance(node, ast.For) and _is_row_iter(node.iter):
+            add(node, "row_loop")
+    for calls in _to_datetime_calls(tree).values():
+        if len(calls) > 1:
+            add(calls[1], "to_datetime", len(calls) - 1)
+    return issues
+
+
+def estimate_seconds(issues: list[dict]) -> float:
+    return sum(issue["seconds"] for issue in issues)
+
+
+def slow_code_message(issues: list[dict], rows: int) -> str:
+    """Error text for the fix prompt describing why code would be too slow."""
+    details = "; ".join(
+        f"line {issue['line']}: {issue['message']}" if issue["line"] else issue["message"]
+        for issue in issues
+    )
+    return (
+        f"Code is estimated to take about {estimate_seconds(issues):.0f} seconds on "
+        f"{rows:,} rows. {details}"
+    )
@@ -1,17 +1,141 @@
 """Command handlers."""
 
+import contextlib
 import pandas as pd
-from backend.state import get_dataframe, get_metadata, set_dataframe, set_metadata
+from backend.state import (
+    DEFAULT_DATASET_ID,
+    dataset_scope,
+    get_dataframe,
+    get_store,
+    get_metadata,
+    set_dataframe,
+    set_metadata,
+    use_dataset,
+    select_dataset,
+    drop_dataset,
+    list_datasets,
+    get_active_dataset_id,
+    get_dataset_id,
+    get_cache_stats,
+)
+from backend.session import checkpoint
 from backend.llm import get_llm
-from backend.csv_handler import load_csv
-from backend.metadata import generate_metadata, calculate_statistics
-from backend.analysis import run_analysis, get_metrics
+from backend.csv_handler import load_csv, load_file, append_csv, append_file
+from backend.metadata import (
+    generate_metadata,
+    calculate_statistics,
+    calculate_statistics_chunked,
+    MIN_STATISTICS,
+    schema_fingerprint,
+    get_cached_metadata,
+    put_cached_metadata,
+    apply_local_health,
+)
+from backend.analysis import run_analysis, get_metrics, get_metrics_series
+from backend.sandbox import SandboxUnavailable
+from backend.aggregates import get_cube
+from backend.query_cache import (
+    dataset_fingerprint,
+    get_cached_answer,
+    find_similar_answer,
+    put_cached_answer,
+)
+
+# Commands that wait on LLM round-trips or parse whole files. In multiplexed mode main.py
+# runs these on a separate worker pool so cheap commands (ping, get_metrics, ...) are never
+# queued behind them.
+SLOW_COMMANDS = frozenset({
+    "generate_metadata",
+    "run_analysis",
+    "validate_api_key",
+    "load_csv",
+    "load_file",
+    "append_csv",
+})
+
+# Commands that create a dataset (payload dataset_id, or the default dataset) and make it
+# the active one once it has loaded.
+LOAD_COMMANDS = frozenset({"load_csv", "load_file"})
+
+# Commands whose payload dataset_id names the dataset to switch to or forget, rather
+# than the dataset to work on.
+REGISTRY_COMMANDS = frozenset({"select_dataset", "drop_dataset"})
+
+# Commands that change a dataset or its metadata; handle checkpoints the session after
+# each successful one.
+CHECKPOINT_COMMANDS = frozenset(
+    {
+        "load_csv",
+        "load_file",
+        "append_csv",
+        "set_metadata",
+        "generate_metadata",
+        "select_dataset",
+        "drop_dataset",
+    }
+)
 
 
 def cmd_load_csv(payload: dict):
     """Handle load_csv command."""
     csv_base64 = payload.get("csv_base64")
-    return load_csv(csv_base64)
+    result = load_csv(csv_base64)
+    use_dataset(get_dataset_id())
+    return {**result, "dataset_id": get_dataset_id()}
+
+
+def cmd_load_file(payload: dict):
+    """Handle load_file command (load a CSV by local path instead of base64)."""
+    path = payload.get("path")
+    result = load_file(path, chunked=payload.get("chunked"))
+    use_dataset(get_dataset_id())
+    return {**result, "dataset_id": get_dataset_id()}
+
+
+def cmd_append_csv(payload: dict):
+    """Handle append_csv command (add new rows to the loaded dataset, keeping metadata)."""
+    if payload.get("path"):
+        return append_file(payload["path"])
+    return append_csv(payload.get("csv_base64"))
+
+
+def cmd_list_datasets(payload: dict):
+    """Handle list_datasets command."""
+    return {"datasets": list_datasets(), "active": get_active_dataset_id()}
+
+
+def cmd_select_dataset(payload: dict):
+    """Handle select_dataset command (switch the active dataset without re-uploading)."""
+    dataset_id = payload.get("dataset_id")
+    if not dataset_id:
+        raise ValueError("No dataset selected.")
+    select_dataset(dataset_id)
+    with dataset_scope(dataset_id):
+        df = get_dataframe()
+        source = df if df is not None else get_store()
+        if source is None:
+            raise ValueError("This dataset is no longer in memory. Please load the file again.")
+        return {
+            "dataset_id": dataset_id,
+            "rows": int(source.shape[0]),
+            "cols": int(source.shape[1]),
+            "columns": [str(c) for c in source.columns],
+            "metadata": get_metadata(),
+        }
+
+
+def cmd_drop_dataset(payload: dict):
+    """Handle drop_dataset command."""
+    dataset_id = payload.get("dataset_id")
+    if not dataset_id:
+        raise ValueError("No dataset selected.")
+    drop_dataset(dataset_id)
+    return {"ok": True, "active": get_active_dataset_id()}
+
+
+def cmd_cache_stats(payload: dict):
+    """Handle cache_stats command (hit rates of the in-process memo caches)."""
+    return get_cache_stats()
 
 
 def cmd_set_metadata(payload: dict):
@@ -19,16 +143,71 @@ def cmd_set_metadata(payload: dict):
     metadata = payload.get("metadata")
     if not isinstance(metadata, dict):
         raise ValueError("Invalid metadata payload.")
+    store = get_store()
+    if store is not None and metadata.get("primary_date") in store.columns:
+        store.date_columns = [metadata["primary_date"]]
     set_metadata(metadata)
     return {"ok": True}
 
 
 def cmd_generate_metadata(payload: dict):
-    """Handle generate_metadata command."""
+    """Handle generate_metadata command.
+
+    Metadata for a schema seen before (same columns and dtype families, and industry
+    hint if given) is reused without an LLM call unless payload "force_refresh" is set;
+    statistics and health are recomputed from the data either way.
+    """
     df = get_dataframe()
-    if df is None:
+    store = get_store()
+    if df is None and store is None:
         raise ValueError("No dataset loaded. Please load a CSV file first.")
 
+    # Number of dashboard statistics to compute (null for every suggestion).
+    limit = payload.get("max_statistics", MIN_STATISTICS)
+    if limit is not None:
+        limit = max(int(limit), MIN_STATISTICS)
+    # Sketch-based nunique/median/percentiles for very large datasets (reports error bounds).
+    approximate = bool(payload.get("approximate", False))
+    industry_hint = payload.get("industry")
+    fingerprint = schema_fingerprint(df if df is not None else store, industry_hint)
+
+    md = None if payload.get("force_refresh") else get_cached_metadata(fingerprint)
+    if md is not None:
+        md = apply_local_health(md, df if df is not None else store.head())
+        md["from_cache"] = True
+    else:
+        md = _generate_metadata_with_llm(payload, df, store, industry_hint)
+        put_cached_metadata(fingerprint, md)
+
+    if df is None:
+        if md.get("primary_date") and md["primary_date"] in store.columns:
+            store.date_columns = [md["primary_date"]]
+        md["statistics"] = calculate_statistics_chunked(
+            store, md, limit=limit, approximate=approximate
+        )
+        set_metadata(md)
+        get_cube(store, md)
+        return md
+
+    # optional preprocessing
+    if md.get("primary_date") and md["primary_date"] in df.columns:
+        # A converted copy: the stored DataFrame may still be read (e.g. by a checkpoint).
+        primary_date = md["primary_date"]
+        df = df.assign(**{primary_date: pd.to_datetime(df[primary_date], errors="coerce")})
+        set_dataframe(df)
+
+    # Calculate accurate statistics from the actual data
+    statistics = calculate_statistics(df, md, limit=limit, approximate=approximate)
+    md["statistics"] = statistics
+
+    set_metadata(md)
+    # Build the time-bucket cube now so the first dashboard refresh is already cheap.
+    get_cube(df, md)
+    return md
+
+
+def _generate_metadata_with_llm(payload: dict, df, store, industry_hint) -> dict:
+    """Ask the LLM for metadata (industry, key roles, catalog, statistic suggestions)."""
     api_key = payload.get("openai_api_key")
     model = payload.get("model", "gpt-4o")
     if not api_key:
@@ -53,7 +232,8 @@ def cmd_generate_metadata(payload: dict):
         raise ValueError(f"API key error: {str(e)}")
 
     try:
-        md = generate_metadata(df, llm)
+        # Out-of-core datasets are described to the LLM from their first rows.
+        md = generate_metadata(df if df is not None else store.head(), llm, industry_hint)
         if not md:
             raise RuntimeError(
                 "Failed to generate metadata. The LLM response was invalid. Please try again."
@@ -63,24 +243,12 @@ def cmd_generate_metadata(payload: dict):
         raise
     except Exception as e:
         raise RuntimeError(f"Failed to generate metadata: {str(e)}")
-
-    # optional preprocessing
-    if md.get("primary_date") and md["primary_date"] in df.columns:
-        df[md["primary_date"]] = pd.to_datetime(df[md["primary_date"]], errors="coerce")
-        set_dataframe(df)
-
-    # Calculate accurate statistics from the actual data
-    statistics = calculate_statistics(df, md)
-    md["statistics"] = statistics
-
-    set_metadata(md)
     return md
 
 
 def cmd_get_metrics(payload: dict):
     """Handle get_metrics command."""
-    df = get_dataframe()
-    if df is None:
+    if get_dataframe() is None and get_store() is None:
         raise ValueError("No dataset loaded. Please load a CSV file first.")
 
     metadata = get_metadata()
@@ -90,9 +258,34 @@ def cmd_get_metrics(payload: dict):
     return get_metrics(metadata)
 
 
-def cmd_run_analysis(payload: dict):
-    """Handle run_analysis command."""
+def cmd_get_metrics_series(payload: dict):
+    """Handle get_metrics_series command (dashboard trend over the last N periods)."""
+    if get_dataframe() is None and get_store() is None:
+        raise ValueError("No dataset loaded. Please load a CSV file first.")
+
+    metadata = get_metadata()
+    if metadata is None:
+        raise ValueError("No metadata available. Please generate metadata first.")
+
+    try:
+        periods = int(payload.get("periods", 12))
+    except (TypeError, ValueError):
+        raise ValueError("The number of periods must be a whole number.")
+    return {
+        "granularity": payload.get("granularity", "month"),
+        "series": get_metrics_series(metadata, payload.get("granularity", "month"), periods),
+    }
+
+
+def cmd_run_analysis(payload: dict, emit=None):
+    """Handle run_analysis command.
+
+    With payload "stream": true and an emit callback (multiplexed mode only), explanation
+    tokens are passed to emit as they arrive, before the final result is returned.
+    """
     df = get_dataframe()
+    if df is None:
+        df = get_store()
     if df is None:
         raise ValueError("No dataset loaded. Please load a CSV file first.")
 
@@ -111,6 +304,19 @@ def cmd_run_analysis(payload: dict):
     if not query:
         raise ValueError("Query is required. Please enter a question to analyze.")
 
+    # Repeat (or reworded) questions against unchanged data and metadata are answered
+    # from the cache.
+    fingerprint = dataset_fingerprint(df, metadata)
+    cached = None
+    if not payload.get("force_refresh"):
+        cached = get_cached_answer(fingerprint, query, model, bot_id)
+        if cached is None:
+            cached = find_similar_answer(fingerprint, query, model, bot_id)
+    if cached is not None:
+        if emit is not None and payload.get("stream"):
+            emit(cached)
+        return {"answer": cached, "from_cache": True}
+
     try:
         llm = get_llm(model, api_key)
     except Exception as e:
@@ -128,12 +334,24 @@ def cmd_run_analysis(payload: dict):
         raise ValueError(f"API key error: {str(e)}")
 
     try:
-        answer = run_analysis(query, df, llm, metadata, bot_id=bot_id)
-        return {"answer": answer}
+        on_chunk = emit if payload.get("stream") else None
+        answer = run_analysis(
+            query,
+            df,
+            llm,
+            metadata,
+            bot_id=bot_id,
+            on_chunk=on_chunk,
+            refresh=bool(payload.get("force_refresh")),
+        )
+    except SandboxUnavailable:
+        raise
     except Exception as e:
         raise RuntimeError(
             f"Analysis failed: {str(e)}. Please try rephrasing your question."
         )
+    put_cached_answer(fingerprint, query, model, bot_id, answer)
+    return {"answer": answer}
 
 
 def cmd_validate_api_key(payload: dict):
@@ -177,23 +395,59 @@ def cmd_validate_api_key(payload: dict):
         raise RuntimeError(f"API validation failed: {str(e)}")
 
 
-def handle(msg: dict):
-    """Handle incoming command messages."""
+def handle(msg: dict, emit=None):
+    """Handle incoming command messages.
+
+    emit, when provided, is a callback for sending partial output (e.g. streamed tokens)
+    ahead of the final reply.
+
+    The command works on the dataset named by payload "dataset_id" (default: the one
+    active when it starts) for its whole run, even if another request switches or
+    loads datasets meanwhile.
+    """
     cmd = msg.get("cmd")
     payload = msg.get("payload", {})
 
+    if cmd in REGISTRY_COMMANDS:
+        scope = contextlib.nullcontext()
+    elif cmd in LOAD_COMMANDS:
+        scope = dataset_scope(payload.get("dataset_id") or DEFAULT_DATASET_ID, create=True)
+    else:
+        scope = dataset_scope(payload.get("dataset_id"))
+    with scope:
+        result = _dispatch(cmd, payload, emit)
+        if cmd in CHECKPOINT_COMMANDS:
+            checkpoint()
+    return result
+
+
+def _dispatch(cmd, payload: dict, emit=None):
     if cmd == "ping":
         return "pong"
     if cmd == "load_csv":
         return cmd_load_csv(payload)
+    if cmd == "load_file":
+        return cmd_load_file(payload)
+    if cmd == "append_csv":
+        return cmd_append_csv(payload)
+    if cmd == "list_datasets":
+        return cmd_list_datasets(payload)
+    if cmd == "select_dataset":
+        return cmd_select_dataset(payload)
+    if cmd == "drop_dataset":
+        return cmd_drop_dataset(payload)
+    if cmd == "cache_stats":
+        return cmd_cache_stats(payload)
     if cmd == "set_metadata":
         return cmd_set_metadata(payload)
     if cmd == "generate_metadata":
         return cmd_generate_metadata(payload)
     if cmd == "get_metrics":
         return cmd_get_metrics(payload)
+    if cmd == "get_metrics_series":
+        return cmd_get_metrics_series(payload)
     if cmd == "run_analysis":
-        return cmd_run_analysis(payload)
+        return cmd_run_analysis(payload, emit=emit)
     if cmd == "validate_api_key":
         return cmd_validate_api_key(payload)
 
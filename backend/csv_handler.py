@@ -1,9 +1,84 @@
 """CSV file loading and encoding handling."""
 
 import io
+import os
+import csv
+import mmap
 import base64
+import codecs
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from backend.state import set_dataframe, set_metadata
+from backend.state import (
+    get_dataframe,
+    get_metadata,
+    get_source,
+    get_store_paths,
+    set_dataframe,
+    set_store,
+    set_metadata,
+    set_loaded_name,
+    set_source,
+)
+from backend.chunked_store import (
+    CHUNKED_CACHE_MAX_BYTES,
+    CHUNKED_THRESHOLD_BYTES,
+    evict_stores,
+    ingest_csv_chunked,
+)
+from backend.dtype_optimizer import optimize_dtypes, conform_to_schema
+from backend.metadata import update_statistics
+from backend.dataset_cache import (
+    cache_enabled,
+    content_hash,
+    get_cached_dataset,
+    put_cached_dataset,
+)
+
+
+class _MmapReader(io.RawIOBase):
+    """Read-only raw stream over an mmap that copies only what the reader asks for."""
+
+    def __init__(self, mm: mmap.mmap):
+        self._mm = mm
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._mm) - self._pos))
+        b[:n] = self._mm[self._pos : self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._mm)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def _open_buffer(raw) -> io.IOBase:
+    """Return a fresh binary file-like view of raw bytes or an mmap, positioned at the start."""
+    if isinstance(raw, mmap.mmap):
+        # Wrapping (rather than BytesIO(raw)) avoids copying the whole mapped file.
+        return io.BufferedReader(_MmapReader(raw))
+    return io.BytesIO(raw)
+
+
+def _decode(raw, encoding: str, errors: str = "strict") -> str:
+    """Decode bytes or any buffer (e.g. an mmap) to text."""
+    return str(raw, encoding, errors)
 
 
 def contains_unicode(data: bytes) -> bool:
@@ -27,53 +102,294 @@ def contains_unicode(data: bytes) -> bool:
     return False
 
 
-def try_read_csv(
-    raw: bytes, encoding: str, use_errors_replace: bool = False
-) -> tuple[pd.DataFrame | None, Exception | None]:
-    """Try to read CSV with a specific encoding."""
+# How much of the file detect_encoding looks at. Large enough to see past ASCII-only
+# headers into the data rows, small enough that detection cost is independent of file size.
+DETECTION_SAMPLE_BYTES = 256 * 1024
+
+CANDIDATE_DELIMITERS = [",", ";", "\t", "|"]
+
+
+def _detection_sample(raw) -> bytes:
+    """Bounded prefix of raw, cut at the last newline so no record or character is split."""
+    if len(raw) <= DETECTION_SAMPLE_BYTES:
+        return raw[:]
+    sample = raw[:DETECTION_SAMPLE_BYTES]
+    cut = sample.rfind(b"\n")
+    return sample[: cut + 1] if cut > 0 else sample
+
+
+def _looks_hebrew_8bit(sample: bytes) -> bool:
+    """True if most high bytes fall in the windows-1255/iso-8859-8 Hebrew letter range."""
+    high = sum(1 for b in sample if b >= 0x80)
+    if high == 0:
+        return False
+    hebrew = sum(1 for b in sample if 0xE0 <= b <= 0xFA)
+    return hebrew / high >= 0.6
+
+
+def _detect_delimiter(text: str) -> str:
+    """Pick the delimiter from a decoded sample, preferring csv.Sniffer."""
+    lines = [line for line in text.splitlines()[:50] if line.strip()]
+    if not lines:
+        return ","
     try:
-        raw_io = io.BytesIO(raw)
-        # Try with lenient CSV parsing
+        dialect = csv.Sniffer().sniff("\n".join(lines), delimiters="".join(CANDIDATE_DELIMITERS))
+        return dialect.delimiter
+    except csv.Error:
+        pass
+    # Sniffer gives up on irregular files: take the delimiter that appears most
+    # consistently (same count on every line, then highest count).
+    best, best_score = ",", (0, 0)
+    for delimiter in CANDIDATE_DELIMITERS:
+        counts = [line.count(delimiter) for line in lines]
+        if counts[0] == 0:
+            continue
+        score = (sum(1 for c in counts if c == counts[0]), counts[0])
+        if score > best_score:
+            best, best_score = delimiter, score
+    return best
+
+
+def detect_encoding(raw) -> tuple[str, str]:
+    """Guess (encoding, delimiter) from a bounded sample of the file in one pass."""
+    sample = _detection_sample(raw)
+
+    if sample.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf-8-sig"
+    elif sample.startswith((b"\xff\xfe\x00\x00", b"\x00\x00\xfe\xff")):
+        encoding = "utf-32"
+    elif sample.startswith((b"\xff\xfe", b"\xfe\xff")):
+        encoding = "utf-16"
+    else:
+        encoding = None
         try:
-            # Try with on_bad_lines (pandas >= 1.3.0)
-            # Also try encoding_errors parameter if available (pandas >= 2.0.0)
-            read_params = {
-                "encoding": encoding,
-                "on_bad_lines": "skip",
-                "engine": "python",
-            }
-            # Add encoding_errors if pandas supports it
+            sample.decode("utf-8", errors="strict")
+            encoding = "utf-8"
+        except UnicodeDecodeError:
+            pass
+
+        if encoding is None and _looks_hebrew_8bit(sample):
+            # windows-1255 is a superset of iso-8859-8 and what Excel writes for Hebrew.
+            encoding = "windows-1255"
+
+        if encoding is None:
             try:
-                import pandas as pd_test
+                from charset_normalizer import from_bytes
 
-                if hasattr(pd_test.read_csv, "__code__"):
-                    # Check if encoding_errors parameter exists
-                    import inspect
+                best_match = from_bytes(sample).best()
+                if best_match and best_match.encoding:
+                    encoding = best_match.encoding.lower()
+            except Exception:
+                pass  # charset-normalizer missing or failed; fall through
 
-                    sig = inspect.signature(pd.read_csv)
-                    if "encoding_errors" in sig.parameters:
-                        read_params["encoding_errors"] = (
-                            "replace" if use_errors_replace else "strict"
-                        )
-            except:
-                pass
+        if encoding is None:
+            # cp1252 covers most Western exports; latin-1 would decode anything but
+            # mangles the characters cp1252 adds (quotes, euro sign).
+            encoding = "cp1252"
 
-            df = pd.read_csv(raw_io, **read_params)
-        except TypeError:
-            # Fallback for older pandas versions
-            try:
-                raw_io = io.BytesIO(raw)
-                df = pd.read_csv(
-                    raw_io,
-                    encoding=encoding,
-                    error_bad_lines=False,
-                    warn_bad_lines=False,
-                    engine="python",
-                )
-            except TypeError:
-                # Even older pandas - no error_bad_lines parameter
-                raw_io = io.BytesIO(raw)
-                df = pd.read_csv(raw_io, encoding=encoding, engine="python")
+    try:
+        text = sample.decode(encoding, errors="replace")
+    except LookupError:
+        return "latin-1", ","
+    return encoding, _detect_delimiter(text)
+
+
+# read_csv keyword support differs across pandas versions; inspect it once at import time.
+_READ_CSV_PARAMS = frozenset(inspect.signature(pd.read_csv).parameters)
+
+# Inputs at least this large are parsed in parallel (BACKEND_PARALLEL_PARSE_MB).
+PARALLEL_MIN_BYTES = int(os.environ.get("BACKEND_PARALLEL_PARSE_MB", "50")) * 1024 * 1024
+PARALLEL_MIN_BLOCK_BYTES = 8 * 1024 * 1024
+PARSE_WORKERS = int(os.environ.get("BACKEND_PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+# When the fast parser rejects a file, it is re-parsed in blocks of this size so that
+# only the blocks containing malformed records fall back to the slow python engine.
+BAD_REGION_BLOCK_BYTES = 4 * 1024 * 1024
+
+
+def _read_params(
+    engine: str, encoding: str, sep, use_errors_replace: bool = False
+) -> dict:
+    """Build lenient read_csv keyword arguments supported by the installed pandas."""
+    params = {"encoding": encoding, "engine": engine, "sep": sep}
+    if "on_bad_lines" in _READ_CSV_PARAMS:
+        params["on_bad_lines"] = "skip"
+    elif "error_bad_lines" in _READ_CSV_PARAMS:
+        params["error_bad_lines"] = False
+        params["warn_bad_lines"] = False
+    if "encoding_errors" in _READ_CSV_PARAMS:
+        params["encoding_errors"] = "replace" if use_errors_replace else "strict"
+    return params
+
+
+def _is_ascii_compatible(encoding: str) -> bool:
+    """True if newline and quote bytes mean the same in this encoding as in ASCII."""
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        return False
+    return not name.startswith(("utf-16", "utf-32"))
+
+
+def _count_quotes(raw, start: int, end: int) -> int:
+    """Count double-quote bytes in raw[start:end] (bytes or mmap)."""
+    if isinstance(raw, (bytes, bytearray)):
+        return raw.count(b'"', start, end)
+    return raw[start:end].count(b'"')
+
+
+def _record_blocks(raw, block_size: int) -> list[tuple[int, int]]:
+    """Split raw into (start, end) byte ranges that end on record boundaries.
+
+    A newline is a record boundary only when the number of quote characters before it
+    (within the block) is even, so quoted fields that contain newlines are never cut.
+    """
+    n = len(raw)
+    blocks = []
+    start = 0
+    while start < n:
+        end = min(start + block_size, n)
+        if end < n:
+            quotes = _count_quotes(raw, start, end)
+            pos = end
+            while True:
+                nl = raw.find(b"\n", pos)
+                if nl == -1:
+                    end = n
+                    break
+                quotes += _count_quotes(raw, pos, nl)
+                if quotes % 2 == 0:
+                    end = nl + 1
+                    break
+                pos = nl + 1
+        blocks.append((start, end))
+        start = end
+    return blocks
+
+
+def _parse_block(
+    raw,
+    start: int,
+    end: int,
+    encoding: str,
+    sep: str,
+    names: list | None,
+    engine: str,
+    dtype: dict | None = None,
+    use_errors_replace: bool = False,
+) -> pd.DataFrame:
+    """Parse one record block. The first block carries the header; others use names."""
+    params = _read_params(engine, encoding, sep, use_errors_replace)
+    if names is not None:
+        params["header"] = None
+        params["names"] = names
+    if dtype:
+        params["dtype"] = dtype
+    return pd.read_csv(io.BytesIO(raw[start:end]), **params)
+
+
+def _parse_blocks(
+    raw,
+    blocks: list[tuple[int, int]],
+    encoding: str,
+    sep: str,
+    map_fn=map,
+    use_errors_replace: bool = False,
+    names: list | None = None,
+) -> pd.DataFrame:
+    """Parse record blocks with the fast engine, using python only for blocks it rejects.
+
+    map_fn lets callers run the per-block parses concurrently (e.g. an executor's map).
+    Columns whose inferred type differs between blocks (numbers in one, text in another)
+    are re-read as text everywhere, matching what a single whole-file parse produces.
+    With names, the input has no header row (e.g. the new tail of a grown file).
+    """
+    first_start, first_end = blocks[0]
+    # Later blocks are decoded on their own, so a BOM can only appear in the first one.
+    rest_encoding = "utf-8" if codecs.lookup(encoding).name == "utf-8-sig" else encoding
+    headerless = names is not None
+
+    def parse(block, names=None, dtype=None):
+        start, end = block
+        enc = encoding if start == first_start else rest_encoding
+        try:
+            return _parse_block(
+                raw, start, end, enc, sep, names, "c", dtype, use_errors_replace
+            )
+        except pd.errors.ParserError:
+            return _parse_block(
+                raw, start, end, enc, sep, names, "python", dtype, use_errors_replace
+            )
+
+    if headerless:
+        rest = blocks
+        frames = []
+    else:
+        rest = blocks[1:]
+        head = parse((first_start, first_end))
+        names = list(head.columns)
+        frames = [head]
+    frames += list(map_fn(lambda block: parse(block, names), rest))
+
+    mixed = [
+        col
+        for col in names
+        if len({pd.api.types.is_numeric_dtype(frame[col]) for frame in frames}) > 1
+    ]
+    if mixed:
+        as_text = {col: str for col in mixed}
+        frames = [] if headerless else [parse((first_start, first_end), dtype=as_text)]
+        frames += list(map_fn(lambda block: parse(block, names, as_text), rest))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _read_parallel(
+    raw, encoding: str, sep: str, use_errors_replace: bool = False
+) -> pd.DataFrame:
+    """Parse a large input as record blocks on a thread pool and concatenate in order.
+
+    The C tokenizer releases the GIL, so threads scale across cores without copying
+    parsed frames between processes.
+    """
+    block_size = max(PARALLEL_MIN_BLOCK_BYTES, -(-len(raw) // (PARSE_WORKERS * 2)))
+    blocks = _record_blocks(raw, block_size)
+    with ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="csv-parse") as pool:
+        return _parse_blocks(
+            raw, blocks, encoding, sep, map_fn=pool.map, use_errors_replace=use_errors_replace
+        )
+
+
+def _read_fast(raw, encoding: str, sep: str, use_errors_replace: bool = False) -> pd.DataFrame:
+    """Parse with the C engine; fall back to the python engine only where it fails.
+
+    Inputs of PARALLEL_MIN_BYTES or more are split and parsed on several cores.
+    """
+    if (
+        PARSE_WORKERS > 1
+        and len(raw) >= PARALLEL_MIN_BYTES
+        and _is_ascii_compatible(encoding)
+    ):
+        return _read_parallel(raw, encoding, sep, use_errors_replace)
+
+    try:
+        return pd.read_csv(
+            _open_buffer(raw), **_read_params("c", encoding, sep, use_errors_replace)
+        )
+    except pd.errors.ParserError:
+        if use_errors_replace or not _is_ascii_compatible(encoding):
+            return pd.read_csv(
+                _open_buffer(raw),
+                **_read_params("python", encoding, sep, use_errors_replace),
+            )
+    return _parse_blocks(raw, _record_blocks(raw, BAD_REGION_BLOCK_BYTES), encoding, sep)
+
+
+def try_read_csv(
+    raw: bytes, encoding: str, use_errors_replace: bool = False, sep: str = ","
+) -> tuple[pd.DataFrame | None, Exception | None]:
+    """Try to read CSV with a specific encoding."""
+    try:
+        df = _read_fast(raw, encoding, sep, use_errors_replace)
         # Check if we got a valid dataframe
         if df is not None and not df.empty:
             return df, None
@@ -83,26 +399,9 @@ def try_read_csv(
         if not use_errors_replace:
             try:
                 # Decode with errors='replace' and re-encode as UTF-8
-                decoded = raw.decode(encoding, errors="replace")
+                decoded = _decode(raw, encoding, errors="replace")
                 raw_utf8 = decoded.encode("utf-8")
-                raw_io = io.BytesIO(raw_utf8)
-                try:
-                    df = pd.read_csv(
-                        raw_io, encoding="utf-8", on_bad_lines="skip", engine="python"
-                    )
-                except TypeError:
-                    try:
-                        raw_io = io.BytesIO(raw_utf8)
-                        df = pd.read_csv(
-                            raw_io,
-                            encoding="utf-8",
-                            error_bad_lines=False,
-                            warn_bad_lines=False,
-                            engine="python",
-                        )
-                    except TypeError:
-                        raw_io = io.BytesIO(raw_utf8)
-                        df = pd.read_csv(raw_io, encoding="utf-8", engine="python")
+                df = _read_fast(raw_utf8, "utf-8", sep)
                 if df is not None and not df.empty:
                     return df, None
             except Exception:
@@ -112,20 +411,8 @@ def try_read_csv(
         # Unknown encoding
         return None, e
     except Exception as e:
-        error_str = str(e).lower()
-        # Check if it's an encoding error
-        if (
-            "codec can't decode" in error_str
-            or "invalid continuation byte" in error_str
-            or "can't decode byte" in error_str
-            or "'utf-8' codec can't decode" in error_str
-            or "unknown encoding" in error_str
-            or "codec" in error_str
-            and "decode" in error_str
-        ):
-            return None, e
-        # For CSV parsing errors, we might still want to try other encodings
-        # But mark it as a non-encoding error
+        # Encoding and CSV parsing errors alike: report it so the caller can try
+        # other encodings.
         return None, e
 
 
@@ -162,7 +449,7 @@ def detect_and_convert_encoding(
     try:
         from charset_normalizer import from_bytes
 
-        result = from_bytes(raw)
+        result = from_bytes(raw if isinstance(raw, (bytes, bytearray)) else raw[:])
         if result and len(result) > 0:
             # Get the best match
             best_match = result.best()
@@ -201,7 +488,7 @@ def detect_and_convert_encoding(
 
         try:
             # Try to decode with this encoding (use 'replace' to handle any byte)
-            decoded_text = raw.decode(encoding, errors="replace")
+            decoded_text = _decode(raw, encoding, errors="replace")
 
             # Re-encode as UTF-8
             raw_utf8 = decoded_text.encode("utf-8")
@@ -243,6 +530,83 @@ def load_csv(csv_base64: str) -> dict:
             f"Failed to decode file data: {str(e)}. Please try uploading the file again."
         )
 
+    return load_csv_bytes(raw)
+
+
+def load_file(path: str, chunked: bool | None = None) -> dict:
+    """Load CSV file directly from a local path.
+
+    The file is memory-mapped, so its bytes are paged in by the OS as the parser reads
+    them instead of travelling through stdin as base64. Files of CHUNKED_THRESHOLD_BYTES
+    or more (or any file with chunked=True) are ingested out-of-core instead.
+    """
+    if not path:
+        raise ValueError("File path is required. Please select a CSV file to upload.")
+    if not os.path.isfile(path):
+        raise ValueError(f"File not found: {path}. Please select the file again.")
+
+    size = os.path.getsize(path)
+    if size == 0:
+        raise ValueError(
+            "The CSV file appears to be empty or could not be parsed. "
+            "Please ensure the file contains data and is in a valid CSV format."
+        )
+    if chunked is None:
+        chunked = size >= CHUNKED_THRESHOLD_BYTES
+    if chunked:
+        return load_file_chunked(path)
+
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return load_csv_bytes(mm, name=os.path.basename(path))
+    except OSError as e:
+        raise ValueError(f"Failed to read file: {str(e)}. Please try again.")
+
+
+def load_file_chunked(path: str) -> dict:
+    """Ingest a CSV chunk-wise into an on-disk columnar store and make it the active dataset.
+
+    Only the store handle and summary statistics stay in memory, so files larger than
+    RAM can be loaded.
+    """
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            encoding, sep = detect_encoding(mm)
+    except OSError as e:
+        raise ValueError(f"Failed to read file: {str(e)}. Please try again.")
+
+    try:
+        try:
+            store = ingest_csv_chunked(path, _read_params("c", encoding, sep, use_errors_replace=True))
+        except pd.errors.ParserError:
+            store = ingest_csv_chunked(
+                path, _read_params("python", encoding, sep, use_errors_replace=True)
+            )
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(
+            f"Failed to parse CSV file: {str(e)}. "
+            "Please ensure the file is a valid CSV format with proper delimiters and try again."
+        )
+
+    set_store(store)
+    set_metadata(None)
+    set_loaded_name(os.path.basename(path))
+    # Stores of datasets no longer loaded are only kept while they fit the disk budget.
+    evict_stores(CHUNKED_CACHE_MAX_BYTES, keep=get_store_paths())
+
+    return {
+        "rows": int(store.num_rows),
+        "cols": len(store.columns),
+        "columns": list(store.columns),
+        "encoding": encoding,
+        "chunked": True,
+    }
+
+
+def _read_csv_cascade(raw) -> tuple[pd.DataFrame | None, str | None, Exception | None]:
+    """Exhaustive fallback: try many encodings, conversions and delimiters until one parses."""
     has_unicode = contains_unicode(raw)
 
     # Prioritize UTF-8 encodings, especially for files with Unicode/Hebrew characters
@@ -337,7 +701,7 @@ def load_csv(csv_base64: str) -> dict:
         try:
             # Latin-1 can decode any byte sequence (maps 1:1 to Unicode)
             # This will always succeed, even if characters are wrong
-            decoded_text = raw.decode("latin-1", errors="replace")
+            decoded_text = _decode(raw, "latin-1", errors="replace")
             raw_utf8 = decoded_text.encode("utf-8")
 
             # Try with different delimiters and parsing options
@@ -413,6 +777,20 @@ def load_csv(csv_base64: str) -> dict:
             # Even this fallback failed - file might be corrupted or not a CSV
             last_error = e
 
+    return df, encoding_used, last_error
+
+
+def parse_csv_bytes(raw) -> tuple[pd.DataFrame, str]:
+    """Parse raw CSV bytes (bytes or an mmap) into a DataFrame; returns (df, encoding_used)."""
+    encoding, sep = detect_encoding(raw)
+    df, last_error = try_read_csv(raw, encoding, sep=sep)
+    encoding_used = encoding
+
+    # The sample-based guess did not parse; fall back to the exhaustive cascade.
+    if df is None:
+        df, encoding_used, cascade_error = _read_csv_cascade(raw)
+        last_error = cascade_error or last_error
+
     if df is None or df.empty:
         error_msg = str(last_error).lower() if last_error else ""
 
@@ -472,11 +850,186 @@ def load_csv(csv_base64: str) -> dict:
     # Object dtype preserves Unicode/Hebrew characters correctly
     # No need to convert - pandas already uses object dtype for string columns with Unicode
 
+    return df, encoding_used
+
+
+def load_csv_bytes(raw, name: str | None = None) -> dict:
+    """Parse raw CSV bytes (bytes or an mmap) and make the result the active dataset."""
+    from_cache = False
+    raw_hash = content_hash(raw)
+    cache_key = raw_hash if cache_enabled() else None
+    cached = get_cached_dataset(cache_key) if cache_key else None
+    if cached is not None:
+        df, info = cached
+        encoding_used = info.get("encoding")
+        memory = info.get("memory")
+        from_cache = True
+    else:
+        df, encoding_used = parse_csv_bytes(raw)
+        df, memory = optimize_dtypes(df)
+        if cache_key:
+            put_cached_dataset(cache_key, df, {"encoding": encoding_used, "memory": memory})
+
     set_dataframe(df)
     set_metadata(None)
+    set_loaded_name(name)
+    set_source({"size": len(raw), "hash": raw_hash, "encoding": encoding_used})
+
+    return {
+        "rows": int(df.shape[0]),
+        "cols": int(df.shape[1]),
+        "columns": list(df.columns),
+        "encoding": encoding_used,
+        "from_cache": from_cache,
+        "memory": memory,
+    }
+
+
+def append_csv(csv_base64: str) -> dict:
+    """Append rows from a base64 CSV to the current dataset (see append_csv_bytes)."""
+    if not csv_base64:
+        raise ValueError("CSV file is required. Please select a CSV file to upload.")
+    try:
+        raw = base64.b64decode(csv_base64)
+    except Exception as e:
+        raise ValueError(
+            f"Failed to decode file data: {str(e)}. Please try uploading the file again."
+        )
+    return append_csv_bytes(raw)
+
+
+def append_file(path: str) -> dict:
+    """Append rows from a local CSV file to the current dataset (see append_csv_bytes)."""
+    if not path or not os.path.isfile(path):
+        raise ValueError(f"File not found: {path}. Please select the file again.")
+    if os.path.getsize(path) == 0:
+        return append_csv_bytes(b"")
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return append_csv_bytes(mm)
+    except OSError as e:
+        raise ValueError(f"Failed to read file: {str(e)}. Please try again.")
+
+
+def _codec_or_none(encoding: str | None) -> str | None:
+    """encoding if Python knows it (cascade results like "x (converted...)" are not)."""
+    if not encoding:
+        return None
+    try:
+        codecs.lookup(encoding)
+        return encoding
+    except LookupError:
+        return None
+
+
+def _read_tail(tail: bytes, encoding: str, sep: str, names: list) -> pd.DataFrame:
+    """Parse the header-less new rows of a grown file, like _read_fast does a whole file."""
+    params = _read_params("c", encoding, sep, use_errors_replace=True)
+    try:
+        return pd.read_csv(io.BytesIO(tail), header=None, names=names, **params)
+    except pd.errors.ParserError:
+        if not _is_ascii_compatible(encoding):
+            params["engine"] = "python"
+            return pd.read_csv(io.BytesIO(tail), header=None, names=names, **params)
+    return _parse_blocks(
+        tail,
+        _record_blocks(tail, BAD_REGION_BLOCK_BYTES),
+        encoding,
+        sep,
+        use_errors_replace=True,
+        names=names,
+    )
+
+
+def _drop_overlap(df: pd.DataFrame, new_rows: pd.DataFrame) -> pd.DataFrame:
+    """new_rows without a leading copy of df's rows.
+
+    Used when the appended file is at least as long as the loaded dataset, which is what a
+    re-saved copy of the whole file looks like (same rows plus new ones, different bytes).
+    Raises ValueError when most of the overlap repeats loaded rows but not in order.
+    """
+    n = len(df)
+    loaded = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    head = pd.util.hash_pandas_object(new_rows.iloc[:n], index=False).to_numpy()
+    if np.array_equal(loaded, head):
+        return new_rows.iloc[n:]
+    if np.isin(head, loaded).mean() > 0.5:
+        raise ValueError(
+            "The appended file looks like an edited copy of the loaded dataset rather than "
+            "new rows. Please load it as a new file instead."
+        )
+    return new_rows
+
+
+def append_csv_bytes(raw) -> dict:
+    """Extend the current dataset with new rows, keeping its metadata.
+
+    raw is either a grown version of the loaded file (same bytes plus new rows at the end),
+    in which case only the new tail is parsed, or a file holding just the new rows under
+    the same header. New rows are coerced to the existing column dtypes, and metadata
+    statistics are updated from the new rows rather than recomputed. A full copy of the
+    loaded file with rows added is accepted too; only the rows after the copy are new.
+    """
+    df = get_dataframe()
+    if df is None:
+        raise ValueError("No dataset loaded. Please load a CSV file first.")
+    source = get_source()
+
+    grown = (
+        source is not None
+        and len(raw) >= source["size"]
+        and content_hash(raw, source["size"]) == source["hash"]
+    )
+    if grown:
+        start = source["size"]
+        tail = raw[start:]
+        detected_encoding, sep = detect_encoding(raw)
+        encoding = _codec_or_none(source.get("encoding")) or detected_encoding
+        if codecs.lookup(encoding).name == "utf-8-sig":
+            encoding = "utf-8"  # the BOM belongs to the start of the file, not the tail
+        encoding_used = source.get("encoding")
+        new_rows = pd.DataFrame(columns=df.columns)
+        if tail.strip():
+            new_rows = _read_tail(tail, encoding, sep, list(df.columns))
+    else:
+        new_rows, encoding_used = parse_csv_bytes(raw)
+        if set(new_rows.columns) != set(df.columns):
+            raise ValueError(
+                "The appended file's columns do not match the loaded dataset. "
+                "Please load it as a new file instead."
+            )
+        new_rows = new_rows[list(df.columns)]
+
+    rows_before = len(df)
+    if len(new_rows) > 0:
+        new_rows, existing_updates = conform_to_schema(new_rows, df)
+        if not grown and len(new_rows) >= rows_before:
+            new_rows = _drop_overlap(df, new_rows)
+    if len(new_rows) == 0:
+        # Nothing new: keep the DataFrame, and every cache keyed on it, as it is.
+        return {
+            "rows": int(df.shape[0]),
+            "cols": int(df.shape[1]),
+            "columns": list(df.columns),
+            "rows_added": 0,
+            "incremental": grown,
+        }
+    if existing_updates:
+        df = df.assign(**existing_updates)
+    df = pd.concat([df, new_rows], ignore_index=True)
+
+    set_dataframe(df)
+    set_source({"size": len(raw), "hash": content_hash(raw), "encoding": encoding_used})
+
+    metadata = get_metadata()
+    if len(df) > rows_before and metadata and metadata.get("statistics"):
+        metadata["statistics"] = update_statistics(metadata["statistics"], df, rows_before)
+        set_metadata(metadata)
 
     return {
         "rows": int(df.shape[0]),
         "cols": int(df.shape[1]),
         "columns": list(df.columns),
+        "rows_added": int(len(df) - rows_before),
+        "incremental": grown,
     }
@@ -0,0 +1,100 @@
+"""Content-addressed on-disk cache of parsed datasets.
+
+Entries are keyed by a hash of the raw file bytes, so reopening the same CSV skips
+encoding detection and parsing entirely and becomes a columnar Parquet read.
+"""
+import os
+import sys
+import json
+import hashlib
+import pandas as pd
+from backend.storage import PARQUET_AVAILABLE, get_data_dir, write_frame, read_frame
+
+# Total size of cached Parquet files; least recently used entries are evicted beyond it.
+# Set BACKEND_DATASET_CACHE_MB=0 to disable the cache.
+CACHE_MAX_BYTES = int(os.environ.get("BACKEND_DATASET_CACHE_MB", "2048")) * 1024 * 1024
+
+
+def cache_enabled() -> bool:
+    """Whether parsed datasets can be cached on disk."""
+    return PARQUET_AVAILABLE and CACHE_MAX_BYTES > 0
+
+
+def content_hash(raw, length: int | None = None) -> str:
+    """Hash raw file bytes (bytes or an mmap), or only their first length bytes."""
+    digest = hashlib.blake2b(digest_size=20)
+    with memoryview(raw) as view:
+        # Slicing a memoryview does not copy; release it so an mmap can be closed afterwards.
+        with view[:length] as part:
+            digest.update(part)
+    return digest.hexdigest()
+
+
+def _paths(key: str) -> tuple[str, str]:
+    """Data and info file paths for a cache key."""
+    base = os.path.join(get_data_dir("dataset_cache"), key)
+    return f"{base}.parquet", f"{base}.json"
+
+
+def get_cached_dataset(key: str) -> tuple[pd.DataFrame, dict] | None:
+    """Return (df, info) for a cached dataset, or None on a miss."""
+    if not cache_enabled():
+        return None
+    data_path, info_path = _paths(key)
+    if not (os.path.exists(data_path) and os.path.exists(info_path)):
+        return None
+    try:
+        with open(info_path, "r", encoding="utf-8") as f:
+            info = json.load(f)
+        df = read_frame(data_path)
+        # Touch both files: modification time is the LRU clock used by eviction.
+        os.utime(data_path)
+        os.utime(info_path)
+        return df, info
+    except Exception as e:
+        print(f"Dataset cache read failed for {key}: {e}", file=sys.stderr, flush=True)
+        return None
+
+
+def put_cached_dataset(key: str, df: pd.DataFrame, info: dict) -> None:
+    """Store a parsed dataset; failures are logged and otherwise ignored."""
+    if not cache_enabled():
+        return
+    data_path, info_path = _paths(key)
+    try:
+        write_frame(df, data_path)
+        with open(info_path, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False)
+    except Exception as e:
+        print(f"Dataset cache write failed for {key}: {e}", file=sys.stderr, flush=True)
+        for path in (data_path, info_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return
+    evict_datasets(CACHE_MAX_BYTES)
+
+
+def evict_datasets(max_bytes: int) -> None:
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    cache_dir = get_data_dir("dataset_cache")
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".parquet"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name[: -len(".parquet")]))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, key in sorted(entries):
+        if total <= max_bytes:
+            break
+        for path in _paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
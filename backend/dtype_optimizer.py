@@ -0,0 +1,196 @@
+"""Load-time dtype optimisation: categoricals, numeric downcasting, typed money/date columns."""
+import re
+import warnings
+import numpy as np
+import pandas as pd
+from backend.metadata import is_text_column, parse_text_numbers
+
+# Text columns with at most this share of distinct values become categoricals.
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# Rows sampled to decide whether a text column holds dates.
+DATE_SAMPLE_ROWS = 1000
+
+# "₪1,234.50", "$1500", "1,234 USD", "-12.5%": a number with or without thousands groups and
+# a currency symbol, code or percent sign either side. Ambiguous forms such as "1,5" and
+# codes such as "A12" do not match.
+_MONEY_SYMBOL = r"(?:[^\w\s.,-]{1,3}|[A-Z]{3}|ש[\"״]ח)?"
+_MONEY_RE = re.compile(
+    rf"^\s*{_MONEY_SYMBOL}\s*-?(\d{{1,3}}(,\d{{3}})+|\d+)(\.\d+)?\s*{_MONEY_SYMBOL}\s*$"
+)
+_MONEY_DECORATION_RE = re.compile(r"[^\d\s.-]|,")
+# A date part is required: time-only values such as "12:30" are not dates.
+_DATE_HINT_RE = re.compile(r"\d[-/.]\d|\d\s+[A-Za-z]{3}|[A-Za-z]{3}\s+\d")
+# "2024-03-04", "2024/03/04": year first is always followed by the month.
+_YEAR_FIRST_RE = re.compile(r"^\s*\d{4}[-/.]\d")
+
+# Integer dtypes tried in order. A column is downcast only if the square of its largest
+# magnitude still fits, so products of two values in generated code cannot overflow.
+_INT_CANDIDATES = (np.int16, np.int32)
+
+
+def _largest_magnitude(col: pd.Series) -> int:
+    return int(max(abs(int(col.min())), abs(int(col.max())))) if col.notna().any() else 0
+
+
+def _safe_int_dtype(largest: int) -> np.dtype:
+    """Narrowest integer dtype in which largest * largest still fits."""
+    for dtype in _INT_CANDIDATES:
+        if largest * largest <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _downcast_int(col: pd.Series) -> pd.Series | None:
+    if len(col) == 0:
+        return None
+    dtype = _safe_int_dtype(_largest_magnitude(col))
+    if dtype.itemsize >= col.dtype.itemsize:
+        return None
+    return col.astype(dtype)
+
+
+def _downcast_float(col: pd.Series) -> pd.Series | None:
+    if col.dtype != np.float64:
+        return None
+    narrowed = col.astype(np.float32)
+    # Only when lossless: money values such as 12.34 are not exact in float32.
+    if np.array_equal(narrowed.to_numpy(np.float64), col.to_numpy(), equal_nan=True):
+        return narrowed
+    return None
+
+
+def _parse_money(values: pd.Series, col: pd.Series) -> pd.Series | None:
+    """Convert a text column of formatted amounts to float64, only if every value parses."""
+    text = values.astype(str)
+    if not text.str.match(_MONEY_RE).all():
+        return None
+    # Plain numbers would already be numeric; require at least one symbol or separator.
+    if not text.str.contains(_MONEY_DECORATION_RE).any():
+        return None
+    return parse_text_numbers(col).astype(np.float64)
+
+
+def _parse_dates(values: pd.Series, col: pd.Series) -> pd.Series | None:
+    """Convert a text column to datetime64, only if every non-null value parses.
+
+    Day-first and month-first are both tried; a column that parses both ways with
+    different results (e.g. only "03/04/2024"-style values) is ambiguous and stays text.
+    """
+    sample = values.head(DATE_SAMPLE_ROWS).astype(str)
+    if not sample.str.contains(_DATE_HINT_RE).all():
+        return None
+    orders = (False,) if sample.str.match(_YEAR_FIRST_RE).all() else (True, False)
+    results = []
+    for dayfirst in orders:
+        try:
+            with warnings.catch_warnings():
+                # pandas warns when the inferred format disagrees with dayfirst; the
+                # all-values-parse check below is what decides.
+                warnings.simplefilter("ignore", UserWarning)
+                if pd.to_datetime(sample, errors="coerce", dayfirst=dayfirst).isna().any():
+                    continue
+                parsed = pd.to_datetime(col, errors="coerce", dayfirst=dayfirst)
+        except (ValueError, TypeError, OverflowError):
+            continue
+        if parsed.notna().sum() == len(values):
+            results.append(parsed)
+    if len(results) == 2 and not results[0].equals(results[1]):
+        return None
+    return results[0] if results else None
+
+
+def optimize_dtypes(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """Shrink a freshly loaded DataFrame's memory footprint.
+
+    Returns (optimised_df, info) where info reports memory before/after and the new
+    dtype of every converted column.
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    converted: dict[str, str] = {}
+    out = {}
+
+    for name in df.columns:
+        col = df[name]
+        new = None
+        if pd.api.types.is_bool_dtype(col.dtype):
+            pass
+        elif pd.api.types.is_integer_dtype(col.dtype):
+            new = _downcast_int(col)
+        elif pd.api.types.is_float_dtype(col.dtype):
+            new = _downcast_float(col)
+        elif is_text_column(col):
+            values = col.dropna()
+            if len(values) > 0:
+                new = _parse_money(values, col)
+                if new is None:
+                    new = _parse_dates(values, col)
+                if new is None and values.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(values):
+                    new = col.astype("category")
+        if new is not None:
+            out[name] = new
+            converted[name] = str(new.dtype)
+
+    if out:
+        df = df.copy(deep=False)
+        for name, series in out.items():
+            df[name] = series
+
+    after = int(df.memory_usage(deep=True).sum())
+    return df, {
+        "memory_before_bytes": before,
+        "memory_after_bytes": after,
+        "memory_saved_bytes": before - after,
+        "converted_columns": converted,
+    }
+
+
+def conform_to_schema(new_rows: pd.DataFrame, existing: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """Coerce freshly parsed rows to the dtypes of an already optimised DataFrame.
+
+    Returns (new_rows, existing_updates). existing_updates holds replacement columns for
+    existing (categoricals widened with new categories) so both sides concatenate
+    without falling back to object dtype.
+    """
+    new_rows = new_rows.copy()
+    existing_updates = {}
+    for name in existing.columns:
+        old, new = existing[name], new_rows[name]
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            categories = old.cat.categories
+            if is_text_column(pd.Series(categories)) and not is_text_column(new):
+                new = new.astype(str).where(new.notna())
+            missing = pd.Index(new.dropna().unique()).difference(categories)
+            if len(missing) > 0:
+                old = old.cat.add_categories(missing)
+                existing_updates[name] = old
+            new_rows[name] = new.astype(old.dtype)
+        elif pd.api.types.is_datetime64_any_dtype(old.dtype):
+            if not pd.api.types.is_datetime64_any_dtype(new.dtype):
+                values = new.dropna()
+                parsed = _parse_dates(values, new) if len(values) > 0 else None
+                new = parsed if parsed is not None else pd.to_datetime(new, errors="coerce")
+            new_rows[name] = new.astype(old.dtype)
+        elif is_text_column(old):
+            if not is_text_column(new):
+                # Numbers under a text column stay text, so .str and num() keep working.
+                values = new.dropna()
+                if pd.api.types.is_float_dtype(new.dtype) and (values == values.round()).all():
+                    new = new.astype("Int64")  # "2", not "2.0", as in the loaded rows
+                new_rows[name] = new.astype(str).where(new.notna()).astype(old.dtype)
+        elif pd.api.types.is_numeric_dtype(old.dtype) and not pd.api.types.is_bool_dtype(old.dtype):
+            if is_text_column(new):
+                # Typed money column: strip the same symbols/separators _parse_money did.
+                new = parse_text_numbers(new)
+            if pd.api.types.is_integer_dtype(old.dtype) and pd.api.types.is_integer_dtype(new.dtype):
+                # Keep the narrow type while new values still fit it with product headroom;
+                # otherwise widen the existing column too.
+                target = _safe_int_dtype(_largest_magnitude(new))
+                if target.itemsize > old.dtype.itemsize:
+                    existing_updates[name] = old.astype(target)
+                    new = new.astype(target)
+                else:
+                    new = new.astype(old.dtype)
+            # Other numeric combinations (e.g. int + float with gaps) upcast in concat.
+            new_rows[name] = new
+    return new_rows, existing_updates
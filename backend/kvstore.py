@@ -0,0 +1,123 @@
+"""Small persistent key-value store (SQLite) for caches that outlive the process.
+
+Values are JSON documents grouped by namespace. Every read refreshes the entry's access
+time, so namespaces can be trimmed least-recently-used first.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from backend.storage import get_data_dir
+
+DB_NAME = "cache.sqlite3"
+
+_lock = threading.Lock()
+_initialised: set[str] = set()
+
+
+def _connect() -> sqlite3.Connection:
+    path = os.path.join(get_data_dir(), DB_NAME)
+    conn = sqlite3.connect(path, timeout=10)
+    if path not in _initialised:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS kv_accessed ON kv (namespace, accessed)")
+        conn.commit()
+        _initialised.add(path)
+    return conn
+
+
+def kv_get(namespace: str, key: str, max_age: float | None = None):
+    """Stored value, or None if missing or older than max_age seconds."""
+    with _lock:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT value, created FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if max_age is not None and now - row[1] > max_age:
+                conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+                conn.commit()
+                return None
+            conn.execute(
+                "UPDATE kv SET accessed = ? WHERE namespace = ? AND key = ?", (now, namespace, key)
+            )
+            conn.commit()
+            return json.loads(row[0])
+        finally:
+            conn.close()
+
+
+def kv_put(namespace: str, key: str, value) -> None:
+    """Store a JSON-serialisable value (replacing any previous one)."""
+    data = json.dumps(value, ensure_ascii=False, default=str)
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, data, now, now),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def kv_items(namespace: str) -> list[tuple[str, object]]:
+    """All (key, value) pairs of a namespace, most recently used first."""
+    with _lock:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                "SELECT key, value FROM kv WHERE namespace = ? ORDER BY accessed DESC", (namespace,)
+            ).fetchall()
+        finally:
+            conn.close()
+    return [(key, json.loads(value)) for key, value in rows]
+
+
+def kv_delete(namespace: str, key: str | None = None) -> None:
+    """Delete one entry, or the whole namespace when key is None."""
+    with _lock:
+        conn = _connect()
+        try:
+            if key is None:
+                conn.execute("DELETE FROM kv WHERE namespace = ?", (namespace,))
+            else:
+                conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def kv_evict(namespace: str, max_entries: int, max_age: float | None = None) -> None:
+    """Drop entries older than max_age seconds, then least recently used beyond max_entries."""
+    with _lock:
+        conn = _connect()
+        try:
+            if max_age is not None:
+                conn.execute(
+                    "DELETE FROM kv WHERE namespace = ? AND created < ?",
+                    (namespace, time.time() - max_age),
+                )
+            conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key NOT IN ("
+                " SELECT key FROM kv WHERE namespace = ? ORDER BY accessed DESC LIMIT ?)",
+                (namespace, namespace, max_entries),
+            )
+            conn.commit()
+        finally:
+            conn.close()
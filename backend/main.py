@@ -2,6 +2,9 @@
 import sys
 import os
 import json
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path so we can import backend modules
 # This is needed when running as a script
@@ -10,39 +13,99 @@ _parent_dir = os.path.dirname(_backend_dir)
 if _parent_dir not in sys.path:
     sys.path.insert(0, _parent_dir)
 
-from backend.commands import handle
+from backend.commands import handle, SLOW_COMMANDS
+from backend.session import restore_session
+from backend.sandbox import start_sandbox, stop_sandbox
 
+# Worker pool sizes for messages that carry an "id" (multiplexed protocol mode).
+# Slow commands (LLM calls, file loads) get their own pool so cheap commands never queue behind them.
+SLOW_WORKERS = int(os.environ.get("BACKEND_SLOW_WORKERS", "4"))
+FAST_WORKERS = int(os.environ.get("BACKEND_FAST_WORKERS", "2"))
 
-def _reply(ok: bool, result=None, error: str | None = None):
+_stdout_lock = threading.Lock()
+
+
+def _write(out: dict) -> None:
+    """Write one JSON line to stdout (safe to call from worker threads)."""
+    # Use ensure_ascii=False to preserve Hebrew/Unicode characters in JSON
+    line = json.dumps(out, ensure_ascii=False) + "\n"
+    with _stdout_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+def _reply(ok: bool, result=None, error: str | None = None, request_id=None):
     """Send a reply to stdout."""
     out = {"ok": ok}
+    if request_id is not None:
+        out["id"] = request_id
     if ok:
         out["result"] = result
     else:
         out["error"] = error or "unknown error"
-    # Use ensure_ascii=False to preserve Hebrew/Unicode characters in JSON
-    sys.stdout.write(json.dumps(out, ensure_ascii=False) + "\n")
-    sys.stdout.flush()
+    _write(out)
+
+
+def _process(msg: dict, request_id=None):
+    """Run one command and reply with its result or error."""
+    emit = None
+    if request_id is not None:
+        # Partial output lines: {"id": ..., "chunk": "..."}; the terminal line is the normal reply.
+        def emit(chunk: str) -> None:
+            _write({"id": request_id, "chunk": chunk})
+
+    try:
+        result = handle(msg, emit=emit)
+        _reply(True, result=result, request_id=request_id)
+    except Exception as e:
+        import traceback
+        error_msg = str(e)
+        traceback_str = traceback.format_exc()
+        print(f"Backend error: {error_msg}\n{traceback_str}", file=sys.stderr, flush=True)
+        _reply(False, error=error_msg, request_id=request_id)
 
 
 def main():
-    """Main loop for processing commands."""
+    """Main loop for processing commands.
+
+    Messages without an "id" are handled inline, one at a time, and answered in order.
+    Messages with an "id" are dispatched to a worker pool; their replies carry the same
+    "id" and may arrive out of order. Streaming commands may first send any number of
+    {"id", "chunk"} lines for that id before the final {"id", "ok", ...} line.
+    """
     print("Backend started", file=sys.stderr, flush=True)
-    for line in sys.stdin:
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            msg = json.loads(line)
-            result = handle(msg)
-            _reply(True, result=result)
-        except Exception as e:
-            import traceback
-            error_msg = str(e)
-            traceback_str = traceback.format_exc()
-            print(f"Backend error: {error_msg}\n{traceback_str}", file=sys.stderr, flush=True)
-            _reply(False, error=error_msg)
+    # Pick up where a crashed or restarted backend left off (data is read lazily).
+    restore_session()
+    # Workers for generated analysis code start in the background.
+    start_sandbox()
+    slow_pool = ThreadPoolExecutor(max_workers=SLOW_WORKERS, thread_name_prefix="backend-slow")
+    fast_pool = ThreadPoolExecutor(max_workers=FAST_WORKERS, thread_name_prefix="backend-fast")
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                msg = json.loads(line)
+            except Exception as e:
+                print(f"Backend error: invalid message: {e}", file=sys.stderr, flush=True)
+                _reply(False, error=str(e))
+                continue
+
+            request_id = msg.get("id") if isinstance(msg, dict) else None
+            if request_id is None:
+                _process(msg)
+                continue
+
+            pool = slow_pool if msg.get("cmd") in SLOW_COMMANDS else fast_pool
+            pool.submit(_process, msg, request_id)
+    finally:
+        fast_pool.shutdown(wait=True)
+        slow_pool.shutdown(wait=True)
+        stop_sandbox()
 
 
 if __name__ == "__main__":
+    # Sandbox workers are started with "spawn"; frozen builds must handle that here.
+    multiprocessing.freeze_support()
     main()
@@ -1,26 +1,60 @@
 """Metadata generation functions."""
 
+import sys
 import json
 import re
+import hashlib
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
-from backend.state import get_dataframe
+from backend.state import get_dataframe, get_store, get_derived, set_derived, memoize
+from backend.profiling import profile_dataframe
+from backend.sketches import HyperLogLog, QuantileSketch
+from backend.kvstore import kv_get, kv_put, kv_evict
 
+METADATA_CACHE_NAMESPACE = "metadata"
+METADATA_CACHE_MAX_ENTRIES = 200
 
-def generate_metadata(df: pd.DataFrame, llm) -> dict | None:
-    """Generate metadata for a dataframe using LLM."""
+# Generated metadata fields that depend only on the schema, and so are reused for any
+# dataset with the same fingerprint. Statistics and health are always recomputed locally.
+SCHEMA_METADATA_FIELDS = (
+    "industry",
+    "primary_date",
+    "primary_money",
+    "entity_col",
+    "catalog",
+    "statistics_suggestions",
+)
+
+
+def _profile(df: pd.DataFrame) -> dict:
+    """Column profile of df, memoised when df is the loaded dataset."""
+    if df is get_dataframe():
+        return memoize("profile", lambda: profile_dataframe(df))
+    return profile_dataframe(df)
+
+
+def generate_metadata(df: pd.DataFrame, llm, industry_hint: str | None = None) -> dict | None:
+    """Generate metadata for a dataframe using LLM.
+
+    Columns are described to the LLM from a local profile, and health_score is taken
+    from that profile rather than guessed by the LLM.
+    """
+    profile = _profile(df)
     col_summary = []
-    for c in df.columns:
-        sample_vals = df[c].dropna().unique()[:3].tolist()
-        col_summary.append(
-            {"col_name": c, "dtype": str(df[c].dtype), "sample_values": sample_vals}
-        )
+    for c, col_profile in profile["columns"].items():
+        summary = {"col_name": c, **col_profile}
+        if not summary["top_values"] or summary["distinct"] > 50:
+            # Frequencies say little about near-unique columns (ids, free text).
+            summary.pop("top_values")
+        col_summary.append(summary)
 
     prompt = f"""
 Act as a Senior Business Consultant.
 Analyze dataset structure: {json.dumps(col_summary, ensure_ascii=False)}
 
 GOAL: Create a 'Rich Business Metadata Catalog'.
+{f"INDUSTRY HINT (from the user): {industry_hint}" if industry_hint else ""}
 
 INSTRUCTIONS:
 - Give strategic descriptions (e.g., "The transactional timestamp, critical for seasonal revenue").
@@ -30,11 +64,11 @@ TASKS:
 1. Identify Industry (Logistics, Auto, Medical).
 2. Map Key Roles: primary_date_col, primary_money_col, entity_col (Driver/Rep/Doctor).
 3. Create 'catalog' with 'rich_desc'.
-4. Calculate 'health_score' (0-100).
+4. Write 'health_advice' for this data-quality assessment: score {profile['health_score']}/100, issues: {json.dumps(profile['health_issues'], ensure_ascii=False)}.
 5. Suggest 3 key statistics to calculate from the actual data. For each statistic, specify:
    - A clear, business-focused label (e.g., "Total Revenue", "Average Transaction Value", "Unique Customers")
    - The column name to use for calculation
-   - The operation to perform: "sum", "mean", "count", "nunique", "min", "max", "median", or "percentage" (for percentage calculations)
+   - The operation to perform: "sum", "mean", "count", "nunique", "min", "max", "median", "p90"/"p95" (percentiles), or "percentage" (for percentage calculations)
    - Whether the result should be displayed as a percentage (is_percentage: true/false)
 
 Return ONLY JSON:
@@ -43,7 +77,6 @@ Return ONLY JSON:
   "primary_date": "str",
   "primary_money": "str",
   "entity_col": "str",
-  "health_score": int,
   "health_advice": "str",
   "catalog": [
     {{"col": "name", "rich_desc": "Strategic description..."}}
@@ -57,268 +90,576 @@ Return ONLY JSON:
 """
     try:
         res = llm.invoke(prompt).content
-        return json.loads(re.search(r"\{.*\}", res, re.DOTALL).group())
+        md = json.loads(re.search(r"\{.*\}", res, re.DOTALL).group())
     except:
         return None
+    md["health_score"] = profile["health_score"]
+    return md
 
 
-def calculate_statistics(df: pd.DataFrame, metadata: dict) -> list[dict]:
-    """Calculate statistics from the dataframe based on AI suggestions in metadata."""
-    statistics = []
-    suggestions = metadata.get("statistics_suggestions", [])
+def _dtype_kind(dtype) -> str:
+    """Coarse dtype family, stable across dtype optimisation (int16 vs int64, etc.)."""
+    if isinstance(dtype, pd.CategoricalDtype):
+        return _dtype_kind(dtype.categories.dtype)
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "number"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    return "text"
 
-    # If no suggestions from AI, provide fallback statistics
-    if not suggestions or len(suggestions) == 0:
-        # Fallback: calculate basic statistics
-        total_records = len(df)
-        statistics.append(
-            {
-                "label": "Total Records",
-                "value": float(total_records),
-                "is_percentage": False,
-            }
+
+def schema_fingerprint(data, industry_hint: str | None = None) -> str:
+    """Hash of a dataset's column names and dtype families (plus an optional industry hint).
+
+    data is a DataFrame or a ChunkedDataset; exports with the same layout share a
+    fingerprint even when their rows differ.
+    """
+    if isinstance(data, pd.DataFrame):
+        schema = [[str(col), _dtype_kind(dtype)] for col, dtype in data.dtypes.items()]
+    else:
+        schema = [
+            [str(col), "number" if data.summary[col]["numeric"] else "text"]
+            for col in data.columns
+        ]
+    hint = (industry_hint or "").strip().lower()
+    payload = json.dumps({"schema": schema, "industry": hint}, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def get_cached_metadata(fingerprint: str) -> dict | None:
+    """LLM-generated metadata previously stored for this schema fingerprint."""
+    try:
+        return kv_get(METADATA_CACHE_NAMESPACE, fingerprint)
+    except Exception as e:
+        print(f"Metadata cache read failed: {e}", file=sys.stderr, flush=True)
+        return None
+
+
+def put_cached_metadata(fingerprint: str, metadata: dict) -> None:
+    """Remember the schema-dependent part of generated metadata for this fingerprint."""
+    try:
+        kv_put(
+            METADATA_CACHE_NAMESPACE,
+            fingerprint,
+            {field: metadata[field] for field in SCHEMA_METADATA_FIELDS if field in metadata},
         )
+        kv_evict(METADATA_CACHE_NAMESPACE, METADATA_CACHE_MAX_ENTRIES)
+    except Exception as e:
+        print(f"Metadata cache write failed: {e}", file=sys.stderr, flush=True)
 
-        # Try to find a numeric column for sum/mean
-        numeric_cols = df.select_dtypes(include=["number"]).columns.tolist()
-        if numeric_cols:
-            col = df[numeric_cols[0]]
-            col_data = col.dropna()
-            if len(col_data) > 0:
-                statistics.append(
-                    {
-                        "label": f"Total {numeric_cols[0].replace('_', ' ').title()}",
-                        "value": float(col_data.sum()),
-                        "is_percentage": False,
-                    }
-                )
-                if len(statistics) < 3:
-                    statistics.append(
-                        {
-                            "label": f"Average {numeric_cols[0].replace('_', ' ').title()}",
-                            "value": float(col_data.mean()),
-                            "is_percentage": False,
-                        }
-                    )
-
-        # Fill remaining slots
-        while len(statistics) < 3:
-            if len(statistics) == 1:
-                statistics.append(
-                    {
-                        "label": "Total Columns",
-                        "value": float(len(df.columns)),
-                        "is_percentage": False,
-                    }
-                )
-            elif len(statistics) == 2:
-                total_cells = len(df) * len(df.columns)
-                non_null_cells = df.notna().sum().sum()
-                completeness = (
-                    (non_null_cells / total_cells * 100) if total_cells > 0 else 0.0
-                )
-                statistics.append(
-                    {
-                        "label": "Data Completeness",
-                        "value": completeness,
-                        "is_percentage": True,
-                    }
-                )
-
-        return statistics[:3]
-
-    # Process AI suggestions and calculate actual values
-    for suggestion in suggestions[:3]:  # Limit to 3 statistics
-        try:
-            label = suggestion.get("label", "Statistic")
-            column_name = suggestion.get("column", "")
-            operation = suggestion.get("operation", "count").lower()
-            is_percentage = suggestion.get("is_percentage", False)
 
-            # Skip if column doesn't exist
-            if not column_name or column_name not in df.columns:
-                continue
+def apply_local_health(metadata: dict, df: pd.DataFrame) -> dict:
+    """Set health_score/health_advice from the local profile (for cached metadata)."""
+    profile = _profile(df)
+    metadata["health_score"] = profile["health_score"]
+    metadata["health_advice"] = (
+        " ".join(profile["health_issues"]) if profile["health_issues"] else "No data-quality issues found."
+    )
+    return metadata
 
-            col = df[column_name]
-            value = None
 
-            # Handle different operations
-            if operation == "sum":
-                if col.dtype == "object":
-                    # Try to extract numeric values from strings
-                    try:
-                        numeric_values = (
-                            col.astype(str)
-                            .str.replace(r"[^\d.]", "", regex=True)
-                            .replace("", pd.NA)
-                            .dropna()
-                            .astype(float)
-                        )
-                        value = (
-                            float(numeric_values.sum())
-                            if len(numeric_values) > 0
-                            else 0.0
-                        )
-                    except:
-                        value = 0.0
-                else:
-                    numeric_values = col.dropna()
-                    value = (
-                        float(numeric_values.sum()) if len(numeric_values) > 0 else 0.0
-                    )
+def is_text_column(col: pd.Series) -> bool:
+    """Whether a column holds text (object, pandas string, or categorical of strings)."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return not pd.api.types.is_numeric_dtype(col.cat.categories.dtype)
+    return col.dtype == "object" or pd.api.types.is_string_dtype(col.dtype)
 
-            elif operation == "mean" or operation == "average":
-                if col.dtype == "object":
-                    try:
-                        numeric_values = (
-                            col.astype(str)
-                            .str.replace(r"[^\d.]", "", regex=True)
-                            .replace("", pd.NA)
-                            .dropna()
-                            .astype(float)
-                        )
-                        value = (
-                            float(numeric_values.mean())
-                            if len(numeric_values) > 0
-                            else 0.0
-                        )
-                    except:
-                        value = 0.0
-                else:
-                    numeric_values = col.dropna()
-                    value = (
-                        float(numeric_values.mean()) if len(numeric_values) > 0 else 0.0
-                    )
 
-            elif operation == "count":
-                value = float(len(col.dropna()))
+def clean_numeric(col: pd.Series) -> pd.Series:
+    """Float version of a column aligned with it; text is stripped of currency
+    symbols/separators (the minus sign is kept) and values without a number become NaN."""
+    if not is_text_column(col):
+        return col
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        # Clean each distinct value once and broadcast through the category codes.
+        categories = parse_text_numbers(pd.Series(col.cat.categories)).to_numpy()
+        codes = col.cat.codes.to_numpy()
+        values = np.where(codes >= 0, categories[codes.clip(min=0)], np.nan)
+        return pd.Series(values, index=col.index, name=col.name, dtype=float)
+    return parse_text_numbers(col)
 
-            elif operation == "nunique" or operation == "unique":
-                value = float(col.nunique())
 
-            elif operation == "min":
-                if col.dtype == "object":
-                    try:
-                        numeric_values = (
-                            col.astype(str)
-                            .str.replace(r"[^\d.]", "", regex=True)
-                            .replace("", pd.NA)
-                            .dropna()
-                            .astype(float)
-                        )
-                        value = (
-                            float(numeric_values.min())
-                            if len(numeric_values) > 0
-                            else 0.0
-                        )
-                    except:
-                        value = 0.0
-                else:
-                    numeric_values = col.dropna()
-                    value = (
-                        float(numeric_values.min()) if len(numeric_values) > 0 else 0.0
-                    )
+def parse_text_numbers(col: pd.Series) -> pd.Series:
+    """Floats from formatted text ("₪-1,234.50" -> -1234.5); shared by every money parser."""
+    return pd.to_numeric(
+        col.astype(str).str.replace(r"[^\d.-]", "", regex=True).where(col.notna()),
+        errors="coerce",
+    ).astype(float)
 
-            elif operation == "max":
-                if col.dtype == "object":
-                    try:
-                        numeric_values = (
-                            col.astype(str)
-                            .str.replace(r"[^\d.]", "", regex=True)
-                            .replace("", pd.NA)
-                            .dropna()
-                            .astype(float)
-                        )
-                        value = (
-                            float(numeric_values.max())
-                            if len(numeric_values) > 0
-                            else 0.0
-                        )
-                    except:
-                        value = 0.0
-                else:
-                    numeric_values = col.dropna()
-                    value = (
-                        float(numeric_values.max()) if len(numeric_values) > 0 else 0.0
-                    )
 
-            elif operation == "median":
-                if col.dtype == "object":
+def numeric_column(df: pd.DataFrame, column: str) -> pd.Series:
+    """clean_numeric(df[column]), cached for the loaded dataset until its DataFrame changes.
+
+    Metrics, statistics and generated analysis code all share the cached Series, so a
+    text money column goes through the regex clean-up only once per load.
+    """
+    col = df[column]
+    if not is_text_column(col):
+        return col
+    key = ("numeric", column)
+    values = get_derived(df, key)
+    if values is None:
+        values = clean_numeric(col)
+        set_derived(df, key, values)
+    return values
+
+
+# Operations approximate mode answers from sketches (besides percentiles like "p90").
+SKETCH_OPERATIONS = ("nunique", "unique", "median")
+
+_PERCENTILE_RE = re.compile(r"^p(\d{1,2})$")
+
+# Statistics shown on the dashboard; results are padded up to this many.
+MIN_STATISTICS = 3
+
+# Operation name -> Series reduction applied to the column's numeric values.
+NUMERIC_OPERATIONS = {
+    "sum": "sum",
+    "mean": "mean",
+    "average": "mean",
+    "min": "min",
+    "max": "max",
+    "median": "median",
+}
+
+
+def _completeness(df: pd.DataFrame) -> float:
+    """Percentage of non-null cells."""
+    total_cells = len(df) * len(df.columns)
+    non_null_cells = int(df.count().sum())
+    return (non_null_cells / total_cells * 100) if total_cells > 0 else 0.0
+
+
+def _percentile(operation: str) -> float | None:
+    """Quantile for percentile operations such as "p90" (None for anything else)."""
+    match = _PERCENTILE_RE.match(operation)
+    return int(match.group(1)) / 100 if match else None
+
+
+def _column_sketch(df: pd.DataFrame, column: str, kind: str):
+    """Distinct-count or quantile sketch of a column, built once per loaded dataset."""
+    key = ("sketch", kind, column)
+    sketch = get_derived(df, key)
+    if sketch is None:
+        if kind == "distinct":
+            sketch = HyperLogLog()
+            sketch.update(df[column])
+        else:
+            sketch = QuantileSketch()
+            sketch.update(numeric_column(df, column))
+        set_derived(df, key, sketch)
+    return sketch
+
+
+def sketch_statistic(sketches: dict, operation: str) -> tuple[float, bool, float] | None:
+    """Approximate nunique/median/percentile from column sketches, or None if not covered."""
+    if operation in ("nunique", "unique") and "distinct" in sketches:
+        sketch = sketches["distinct"]
+        return float(round(sketch.estimate())), False, sketch.relative_error
+    q = 0.5 if operation == "median" else _percentile(operation)
+    if q is not None and "quantiles" in sketches:
+        sketch = sketches["quantiles"]
+        value = sketch.quantile(q)
+        return (float(value) if value is not None else 0.0), False, sketch.relative_error
+    return None
+
+
+def aggregate_statistics(
+    df: pd.DataFrame, requests: list[tuple[str, str]], approximate: bool = False
+) -> dict[tuple[str, str], tuple[float, bool, float | None]]:
+    """Compute many (column, operation) statistics in one pass per column.
+
+    Requests are grouped by column: a text column is cleaned at most once (numeric_column)
+    and all of a column's numeric reductions run in a single Series.agg call. Returns
+    {(column, operation): (value, forces_percentage, relative_error)}; relative_error is
+    None for exact values. Pairs that cannot be computed are left out.
+
+    With approximate=True, nunique, median and percentiles come from sketches (built once
+    per dataset) instead of hashing or sorting the column.
+    """
+    total_rows = len(df)
+    by_column: dict[str, list[str]] = {}
+    for column, operation in requests:
+        if column in df.columns and operation not in by_column.get(column, []):
+            by_column.setdefault(column, []).append(operation)
+
+    results = {}
+    for column, operations in by_column.items():
+        col = df[column]
+        if approximate:
+            for operation in [op for op in operations if op in SKETCH_OPERATIONS or _percentile(op) is not None]:
+                try:
+                    kind = "distinct" if operation in ("nunique", "unique") else "quantiles"
+                    answer = sketch_statistic({kind: _column_sketch(df, column, kind)}, operation)
+                except Exception:
+                    answer = None
+                if answer is not None:
+                    results[(column, operation)] = answer
+                    operations.remove(operation)
+
+        reducers = sorted({NUMERIC_OPERATIONS[op] for op in operations if op in NUMERIC_OPERATIONS})
+        quantiles = sorted({_percentile(op) for op in operations if _percentile(op) is not None})
+        reduced: dict = {}
+        if reducers or quantiles:
+            try:
+                values = numeric_column(df, column)
+            except Exception:
+                values = None
+            if values is not None and values.count() == 0:
+                reduced = dict.fromkeys(reducers + quantiles, 0.0)
+            elif values is not None:
+                try:
+                    reduced = values.agg(reducers).to_dict() if reducers else {}
+                except Exception:
+                    # One unsupported reduction (e.g. median of booleans) must not sink the rest.
+                    for reducer in reducers:
+                        try:
+                            reduced[reducer] = getattr(values, reducer)()
+                        except Exception:
+                            continue
+                if quantiles:
                     try:
-                        numeric_values = (
-                            col.astype(str)
-                            .str.replace(r"[^\d.]", "", regex=True)
-                            .replace("", pd.NA)
-                            .dropna()
-                            .astype(float)
-                        )
-                        value = (
-                            float(numeric_values.median())
-                            if len(numeric_values) > 0
-                            else 0.0
-                        )
-                    except:
-                        value = 0.0
+                        reduced.update(values.quantile(quantiles).to_dict())
+                    except Exception:
+                        pass
+
+        non_null = None
+        for operation in operations:
+            try:
+                if operation in NUMERIC_OPERATIONS or _percentile(operation) is not None:
+                    reducer = NUMERIC_OPERATIONS.get(operation, _percentile(operation))
+                    if reducer in reduced:
+                        results[(column, operation)] = (float(reduced[reducer]), False, None)
+                elif operation in ("nunique", "unique"):
+                    results[(column, operation)] = (float(col.nunique()), False, None)
                 else:
-                    numeric_values = col.dropna()
-                    value = (
-                        float(numeric_values.median())
-                        if len(numeric_values) > 0
-                        else 0.0
-                    )
-
-            elif operation == "percentage":
-                # Calculate percentage of non-null values
-                total = len(df)
-                non_null = len(col.dropna())
-                value = (non_null / total * 100) if total > 0 else 0.0
-                is_percentage = True
-
-            else:
-                # Default to count if operation is unknown
-                value = float(len(col.dropna()))
-
-            # Add statistic if we got a valid value
-            if value is not None:
-                statistics.append(
-                    {"label": label, "value": value, "is_percentage": is_percentage}
-                )
-
-        except Exception as e:
-            # Skip this statistic if calculation fails
-            continue
+                    if non_null is None:
+                        non_null = int(col.count())
+                    if operation == "percentage":
+                        # Calculate percentage of non-null values
+                        pct = (non_null / total_rows * 100) if total_rows > 0 else 0.0
+                        results[(column, operation)] = (pct, True, None)
+                    else:
+                        # count, and the default for unknown operations
+                        results[(column, operation)] = (float(non_null), False, None)
+            except Exception:
+                continue
+    return results
+
 
-    # Ensure we return exactly 3 statistics (pad if needed)
-    while len(statistics) < 3:
+def _pad_statistics(statistics: list[dict], total_rows: int, total_cols: int, completeness_fn) -> None:
+    """Pad statistics in place to MIN_STATISTICS entries with generic dataset-level figures."""
+    while len(statistics) < MIN_STATISTICS:
         if len(statistics) == 0:
             statistics.append(
                 {
                     "label": "Total Records",
-                    "value": float(len(df)),
+                    "value": float(total_rows),
                     "is_percentage": False,
+                    "operation": "records",
                 }
             )
         elif len(statistics) == 1:
             statistics.append(
                 {
                     "label": "Total Columns",
-                    "value": float(len(df.columns)),
+                    "value": float(total_cols),
                     "is_percentage": False,
+                    "operation": "columns",
                 }
             )
-        elif len(statistics) == 2:
-            total_cells = len(df) * len(df.columns)
-            non_null_cells = df.notna().sum().sum()
-            completeness = (
-                (non_null_cells / total_cells * 100) if total_cells > 0 else 0.0
-            )
+        else:
             statistics.append(
                 {
                     "label": "Data Completeness",
-                    "value": completeness,
+                    "value": completeness_fn(),
                     "is_percentage": True,
+                    "operation": "completeness",
                 }
             )
 
-    # Return only the first 3 statistics
-    return statistics[:3]
+
+def _requested_statistics(metadata: dict, limit: int | None) -> list[dict]:
+    """Normalised AI statistic suggestions (label, column, operation, is_percentage)."""
+    suggestions = metadata.get("statistics_suggestions") or []
+    if limit is not None:
+        suggestions = suggestions[:limit]
+    requested = []
+    for suggestion in suggestions:
+        if not isinstance(suggestion, dict):
+            continue
+        column_name = suggestion.get("column", "")
+        if not column_name:
+            continue
+        requested.append(
+            {
+                "label": suggestion.get("label", "Statistic"),
+                "column": column_name,
+                "operation": str(suggestion.get("operation", "count")).lower(),
+                "is_percentage": suggestion.get("is_percentage", False),
+            }
+        )
+    return requested
+
+
+def _fallback_statistics(column: str) -> list[dict]:
+    """Sum and average of a numeric column, used when the AI suggested nothing."""
+    title = column.replace("_", " ").title()
+    return [
+        {"label": f"Total {title}", "column": column, "operation": "sum", "is_percentage": False},
+        {"label": f"Average {title}", "column": column, "operation": "mean", "is_percentage": False},
+    ]
+
+
+def _assemble_statistics(requested: list[dict], results: dict) -> list[dict]:
+    """Statistic entries for the requests that produced a value, in request order."""
+    statistics = []
+    for request in requested:
+        key = (request["column"], request["operation"])
+        if key not in results:
+            continue
+        value, forced_percentage, relative_error = results[key]
+        stat = {
+            "label": request["label"],
+            "value": value,
+            "is_percentage": forced_percentage or request["is_percentage"],
+            "column": request["column"],
+            "operation": request["operation"],
+        }
+        if relative_error is not None:
+            stat["approximate"] = True
+            stat["relative_error"] = round(relative_error, 4)
+        statistics.append(stat)
+    return statistics
+
+
+def calculate_statistics(
+    df: pd.DataFrame,
+    metadata: dict,
+    limit: int | None = MIN_STATISTICS,
+    approximate: bool = False,
+) -> list[dict]:
+    """Calculate statistics from the dataframe based on AI suggestions in metadata.
+
+    Up to limit suggestions are computed (all of them with limit=None) in one batched
+    pass, and the result is padded to at least MIN_STATISTICS entries. approximate=True
+    answers nunique/median/percentiles from sketches; those entries carry
+    "approximate" and "relative_error". Results for the loaded dataset are memoised until
+    its data or metadata changes.
+    """
+    if df is not get_dataframe():
+        return _compute_statistics(df, metadata, limit, approximate)
+    return memoize(
+        "statistics",
+        lambda: _compute_statistics(df, metadata, limit, approximate),
+        _suggestions_key(metadata),
+        limit,
+        approximate,
+    )
+
+
+def _suggestions_key(metadata: dict) -> str:
+    return json.dumps(metadata.get("statistics_suggestions") or [], sort_keys=True, default=str)
+
+
+def _compute_statistics(
+    df: pd.DataFrame, metadata: dict, limit: int | None, approximate: bool
+) -> list[dict]:
+    statistics = []
+    requested = _requested_statistics(metadata, limit)
+
+    # If no suggestions from AI, provide fallback statistics
+    if not metadata.get("statistics_suggestions"):
+        statistics.append(
+            {
+                "label": "Total Records",
+                "value": float(len(df)),
+                "is_percentage": False,
+                "operation": "records",
+            }
+        )
+        # Try to find a numeric column for sum/mean
+        numeric_cols = df.select_dtypes(include=["number"]).columns.tolist()
+        if numeric_cols and df[numeric_cols[0]].count() > 0:
+            requested = _fallback_statistics(numeric_cols[0])
+
+    results = aggregate_statistics(
+        df, [(r["column"], r["operation"]) for r in requested], approximate=approximate
+    )
+    statistics.extend(_assemble_statistics(requested, results))
+
+    # Ensure we return at least MIN_STATISTICS statistics (pad if needed)
+    _pad_statistics(statistics, len(df), len(df.columns), lambda: _completeness(df))
+    return statistics[:limit] if limit is not None else statistics
+
+
+def calculate_statistics_chunked(
+    store,
+    metadata: dict,
+    limit: int | None = MIN_STATISTICS,
+    approximate: bool = False,
+) -> list[dict]:
+    """calculate_statistics for an out-of-core ChunkedDataset.
+
+    Answers from the ingestion summary where it is enough (numeric sum/mean/min/max/count),
+    in approximate mode also from the sketches built during ingestion, and loads the
+    remaining suggested columns once, together. Memoised like calculate_statistics.
+    """
+    if store is not get_store():
+        return _compute_statistics_chunked(store, metadata, limit, approximate)
+    return memoize(
+        "statistics",
+        lambda: _compute_statistics_chunked(store, metadata, limit, approximate),
+        _suggestions_key(metadata),
+        limit,
+        approximate,
+    )
+
+
+def _summary_statistic(entry: dict, operation: str, total_rows: int) -> tuple[float, bool, None] | None:
+    """A statistic answered from a chunk-store column summary, or None if it needs the data."""
+    non_null = entry["non_null"]
+    if operation == "count":
+        return float(non_null), False, None
+    if operation == "percentage":
+        return ((non_null / total_rows * 100) if total_rows > 0 else 0.0), True, None
+    if entry["numeric"] and operation in ("sum", "mean", "average", "min", "max"):
+        if non_null == 0:
+            return 0.0, False, None
+        if operation == "sum":
+            return float(entry["sum"]), False, None
+        if operation in ("mean", "average"):
+            return float(entry["sum"] / non_null), False, None
+        return float(entry[operation]), False, None
+    return None
+
+
+def _compute_statistics_chunked(
+    store, metadata: dict, limit: int | None, approximate: bool
+) -> list[dict]:
+    total_rows, total_cols = store.shape
+    summary = store.summary
+
+    def completeness() -> float:
+        total_cells = total_rows * total_cols
+        non_null_cells = sum(entry["non_null"] for entry in summary.values())
+        return (non_null_cells / total_cells * 100) if total_cells > 0 else 0.0
+
+    statistics = []
+    requested = [r for r in _requested_statistics(metadata, limit) if r["column"] in store.columns]
+
+    if not metadata.get("statistics_suggestions"):
+        statistics.append(
+            {
+                "label": "Total Records",
+                "value": float(total_rows),
+                "is_percentage": False,
+                "operation": "records",
+            }
+        )
+        numeric_cols = [col for col in store.columns if summary[col]["numeric"]]
+        if numeric_cols and summary[numeric_cols[0]]["non_null"] > 0:
+            requested = _fallback_statistics(numeric_cols[0])
+
+    results = {}
+    pending = []
+    for request in requested:
+        key = (request["column"], request["operation"])
+        answer = _summary_statistic(summary[request["column"]], request["operation"], total_rows)
+        if answer is None and approximate:
+            answer = sketch_statistic(store.sketches(request["column"]), request["operation"])
+        if answer is None:
+            pending.append(key)
+        else:
+            results[key] = answer
+    if pending:
+        try:
+            frame = store.read(columns=sorted({column for column, _ in pending}))
+            results.update(aggregate_statistics(frame, pending, approximate=approximate))
+        except Exception:
+            pass
+    statistics.extend(_assemble_statistics(requested, results))
+
+    _pad_statistics(statistics, total_rows, total_cols, completeness)
+    return statistics[:limit] if limit is not None else statistics
+
+
+# Operations update_statistics combines from the new rows alone.
+MERGEABLE_OPERATIONS = ("sum", "count", "percentage", "min", "max", "mean", "average")
+
+
+def update_statistics(statistics: list[dict], df: pd.DataFrame, rows_before: int) -> list[dict]:
+    """Fold rows appended after the first rows_before into previously computed statistics.
+
+    Mergeable operations (sum, count, min, max, mean, percentage, dataset totals) are
+    computed for the new rows only with aggregate_statistics and combined with the old
+    value. Others (median, percentiles, nunique) are recomputed for their column through
+    aggregate_statistics, approximately again if they were approximate.
+    """
+    total_rows = len(df)
+    total_cols = len(df.columns)
+    new_rows = df.iloc[rows_before:]
+    merged = aggregate_statistics(
+        new_rows,
+        [
+            (stat.get("column"), stat.get("operation"))
+            for stat in statistics
+            if stat.get("operation") in MERGEABLE_OPERATIONS
+        ],
+    )
+    updated = []
+    for stat in statistics:
+        stat = dict(stat)
+        operation = stat.get("operation")
+        column = stat.get("column")
+        value = stat["value"]
+        try:
+            if operation == "records":
+                value = float(total_rows)
+            elif operation == "columns":
+                value = float(total_cols)
+            elif operation == "completeness":
+                old_cells = rows_before * total_cols
+                new_cells = len(new_rows) * total_cols
+                non_null = value / 100 * old_cells + new_rows.notna().sum().sum()
+                value = (non_null / (old_cells + new_cells) * 100) if old_cells + new_cells else 0.0
+            elif column is not None and column in df.columns:
+                new = merged.get((column, operation))
+                if operation in ("sum", "count") and new is not None:
+                    value += new[0]
+                elif operation == "percentage" and new is not None:
+                    non_null = value / 100 * rows_before + new[0] / 100 * len(new_rows)
+                    value = (non_null / total_rows * 100) if total_rows > 0 else 0.0
+                elif operation in MERGEABLE_OPERATIONS and new is not None:
+                    # min/max/mean of the numeric values: weigh by how many each side has.
+                    values = numeric_column(df, column)
+                    old_n = int(values.iloc[:rows_before].count())
+                    new_n = int(values.iloc[rows_before:].count())
+                    if new_n and not old_n:
+                        value = new[0]
+                    elif new_n and operation == "min":
+                        value = min(value, new[0])
+                    elif new_n and operation == "max":
+                        value = max(value, new[0])
+                    elif new_n:
+                        value = (value * old_n + new[0] * new_n) / (old_n + new_n)
+                else:
+                    # Not mergeable (median, percentiles, nunique, ...): recompute the
+                    # column the same way calculate_statistics does, keeping its mode.
+                    approximate = bool(stat.get("approximate"))
+                    key = (column, operation or "count")
+                    result = aggregate_statistics(df, [key], approximate=approximate).get(key)
+                    if result is not None:
+                        value, _, relative_error = result
+                        stat.pop("approximate", None)
+                        stat.pop("relative_error", None)
+                        if relative_error is not None:
+                            stat["approximate"] = True
+                            stat["relative_error"] = round(relative_error, 4)
+        except Exception:
+            pass
+        stat["value"] = value
+        updated.append(stat)
+    return updated
@@ -0,0 +1,123 @@
+"""Column profiling for metadata generation.
+
+One cheap pass per column: null counts and min/max run over the full column, while
+value frequencies (cardinality estimate, top values) come from a fixed random sample on
+large frames. The dataset health score is derived from the profile deterministically.
+"""
+import math
+import numpy as np
+import pandas as pd
+
+# Frames with more rows than this are profiled on a sample of this many rows.
+PROFILE_SAMPLE_ROWS = 100_000
+
+# Most frequent values reported per column.
+TOP_K = 5
+
+# Example values reported per column.
+SAMPLE_VALUES = 3
+
+
+def _json_value(value):
+    """Make a pandas/numpy scalar safe for json.dumps."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return str(pd.Timestamp(value))
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return None if math.isnan(value) else round(value, 6)
+    if isinstance(value, (int, bool, str)):
+        return value
+    return str(value)
+
+
+def _estimate_distinct(counts: pd.Series, sample_rows: int, total_rows: int) -> int:
+    """Distinct values in the full column, estimated from sample value counts (GEE)."""
+    if sample_rows >= total_rows or sample_rows == 0:
+        return int(len(counts))
+    singletons = int((counts == 1).sum())
+    repeated = int(len(counts)) - singletons
+    if repeated == 0:
+        # No value seen twice: most likely a key column.
+        return int(total_rows)
+    estimate = math.sqrt(total_rows / sample_rows) * singletons + repeated
+    return int(min(round(estimate), total_rows))
+
+
+def profile_column(col: pd.Series, sample: pd.Series, total_rows: int) -> dict:
+    """Profile one column; sample is the same column restricted to the sampled rows."""
+    non_null = int(col.count())
+    counts = sample.value_counts(dropna=True)
+    sample_non_null = int(counts.sum())
+    profile = {
+        "dtype": str(col.dtype),
+        "null_rate": round(1 - non_null / total_rows, 4) if total_rows else 0.0,
+        "distinct": _estimate_distinct(counts, sample_non_null, non_null),
+        "top_values": [
+            {"value": _json_value(value), "share": round(int(count) / sample_non_null, 4)}
+            for value, count in counts.head(TOP_K).items()
+        ],
+        "sample_values": [
+            _json_value(value)
+            for value in col.head(1000).dropna().drop_duplicates().head(SAMPLE_VALUES).tolist()
+        ],
+    }
+    if non_null and (
+        pd.api.types.is_numeric_dtype(col.dtype) and not pd.api.types.is_bool_dtype(col.dtype)
+        or pd.api.types.is_datetime64_any_dtype(col.dtype)
+    ):
+        profile["min"] = _json_value(col.min())
+        profile["max"] = _json_value(col.max())
+    return profile
+
+
+def health_score(columns: dict[str, dict], duplicate_rate: float) -> tuple[int, list[str]]:
+    """Deterministic 0-100 data-quality score and the issues that lowered it.
+
+    Missing cells cost up to 60 points, constant columns 5 each (up to 20), and
+    duplicate rows up to 20.
+    """
+    issues = []
+    if not columns:
+        return 0, ["The dataset has no columns."]
+    missing = sum(p["null_rate"] for p in columns.values()) / len(columns)
+    score = 100.0 - 60.0 * missing
+    if missing > 0.05:
+        issues.append(f"{missing:.0%} of cells are empty.")
+    mostly_empty = [name for name, p in columns.items() if p["null_rate"] > 0.5]
+    if mostly_empty:
+        issues.append(f"Mostly empty columns: {', '.join(map(str, mostly_empty))}.")
+    constant = [name for name, p in columns.items() if p["distinct"] <= 1]
+    if constant:
+        score -= min(5 * len(constant), 20)
+        issues.append(f"Columns with a single value: {', '.join(map(str, constant))}.")
+    if duplicate_rate > 0:
+        score -= 20.0 * duplicate_rate
+        if duplicate_rate > 0.01:
+            issues.append(f"About {duplicate_rate:.0%} of rows are exact duplicates.")
+    return int(round(min(max(score, 0.0), 100.0))), issues
+
+
+def profile_dataframe(df: pd.DataFrame) -> dict:
+    """Profile every column of df plus a dataset-level health score."""
+    total_rows = len(df)
+    sampled = total_rows > PROFILE_SAMPLE_ROWS
+    # Fixed random_state keeps profiles (and so health scores) reproducible.
+    sample = df.sample(n=PROFILE_SAMPLE_ROWS, random_state=0) if sampled else df
+    columns = {str(c): profile_column(df[c], sample[c], total_rows) for c in df.columns}
+    try:
+        duplicate_rate = float(sample.duplicated().mean()) if len(sample) else 0.0
+    except TypeError:
+        # Unhashable cell values (lists, dicts) cannot be compared row-wise.
+        duplicate_rate = 0.0
+    score, issues = health_score(columns, duplicate_rate)
+    return {
+        "rows": total_rows,
+        "sampled": sampled,
+        "columns": columns,
+        "duplicate_rate": round(duplicate_rate, 4),
+        "health_score": score,
+        "health_issues": issues,
+    }
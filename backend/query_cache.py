@@ -0,0 +1,193 @@
+"""Persistent caches for run_analysis results.
+
+Generated analysis code is keyed by the normalised query and the dataset's schema
+fingerprint only, so it is reused across refreshed exports of the same layout.
+
+Answers are keyed by the dataset's content fingerprint (raw-file hash or chunk store,
+plus its metadata), the normalised query, the model and the bot. Any change to the data
+or metadata produces a new key, so stale answers are never served; questions relative to
+today ("last month", "this week") also include the date, so their answers expire at
+midnight. Old entries age out by TTL and least-recently-used trimming.
+
+When there is no exact entry, the find_similar_* lookups match reworded questions
+against the cached ones for the same schema (code) or dataset, model and bot (answers).
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+from datetime import date
+from backend.state import get_source, record_cache_access
+from backend.kvstore import kv_get, kv_put, kv_items, kv_evict, kv_delete
+from backend.bots import normalize_bot_id
+from backend.metadata import schema_fingerprint
+from backend.similarity import SIMILARITY_THRESHOLD, best_match, is_relative_date
+
+ANSWER_NAMESPACE = "answers"
+
+# Answers older than this are recomputed (BACKEND_ANSWER_CACHE_TTL_HOURS).
+ANSWER_TTL_SECONDS = float(os.environ.get("BACKEND_ANSWER_CACHE_TTL_HOURS", "24")) * 3600
+
+ANSWER_MAX_ENTRIES = 500
+
+CODE_NAMESPACE = "analysis_code"
+CODE_MAX_ENTRIES = 1000
+
+
+def normalize_query(query: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a question."""
+    query = re.sub(r"\s+", " ", str(query).strip().lower())
+    return query.rstrip("?.! ")
+
+
+def _digest(payload) -> str:
+    text = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def dataset_fingerprint(data, metadata: dict) -> str | None:
+    """Content fingerprint of the active dataset and its metadata (None if unknown)."""
+    source = get_source()
+    if source and source.get("hash"):
+        identity = source["hash"]
+    elif getattr(data, "path", None):
+        # Chunk stores live in a directory keyed by the source file's path, size and mtime.
+        identity = os.path.basename(data.path)
+    else:
+        return None
+    return _digest({"data": identity, "metadata": metadata})
+
+
+def _today(query: str) -> list[str]:
+    """[today's date] for questions relative to it, so their answers do not outlive the day."""
+    return [date.today().isoformat()] if is_relative_date(query) else []
+
+
+def _answer_key(fingerprint: str, query: str, model: str, bot_id: str | None) -> str:
+    return _digest(
+        [fingerprint, normalize_query(query), model, normalize_bot_id(bot_id)] + _today(query)
+    )
+
+
+def _answer_scope(fingerprint: str, model: str, bot_id: str | None, query: str) -> str:
+    """Everything an answer depends on except the wording of the question."""
+    return _digest([fingerprint, model, normalize_bot_id(bot_id)] + _today(query))
+
+
+def _find_similar(namespace: str, scope: str, query: str) -> dict | None:
+    """Most similar cached entry in scope, if it clears SIMILARITY_THRESHOLD."""
+    entries = [value for _, value in kv_items(namespace) if value.get("scope") == scope]
+    index, score = best_match(normalize_query(query), [e["query"] for e in entries])
+    if index is None or score < SIMILARITY_THRESHOLD:
+        return None
+    return entries[index]
+
+
+def get_cached_answer(fingerprint: str | None, query: str, model: str, bot_id: str | None) -> str | None:
+    """Previously returned answer for this dataset, question, model and bot."""
+    if fingerprint is None:
+        return None
+    try:
+        entry = kv_get(ANSWER_NAMESPACE, _answer_key(fingerprint, query, model, bot_id), ANSWER_TTL_SECONDS)
+    except Exception as e:
+        print(f"Answer cache read failed: {e}", file=sys.stderr, flush=True)
+        entry = None
+    record_cache_access("answers", entry is not None)
+    return entry["answer"] if entry else None
+
+
+def find_similar_answer(fingerprint: str | None, query: str, model: str, bot_id: str | None) -> str | None:
+    """Cached answer to a reworded form of query for the same dataset, model and bot."""
+    if fingerprint is None:
+        return None
+    try:
+        kv_evict(ANSWER_NAMESPACE, ANSWER_MAX_ENTRIES, ANSWER_TTL_SECONDS)
+        entry = _find_similar(ANSWER_NAMESPACE, _answer_scope(fingerprint, model, bot_id, query), query)
+    except Exception as e:
+        print(f"Similar answer lookup failed: {e}", file=sys.stderr, flush=True)
+        entry = None
+    record_cache_access("similar_answers", entry is not None)
+    return entry["answer"] if entry else None
+
+
+def put_cached_answer(fingerprint: str | None, query: str, model: str, bot_id: str | None, answer: str) -> None:
+    """Remember an answer; trims the cache to its TTL and size limits."""
+    if fingerprint is None:
+        return
+    try:
+        kv_put(
+            ANSWER_NAMESPACE,
+            _answer_key(fingerprint, query, model, bot_id),
+            {
+                "query": normalize_query(query),
+                "scope": _answer_scope(fingerprint, model, bot_id, query),
+                "answer": answer,
+            },
+        )
+        kv_evict(ANSWER_NAMESPACE, ANSWER_MAX_ENTRIES, ANSWER_TTL_SECONDS)
+    except Exception as e:
+        print(f"Answer cache write failed: {e}", file=sys.stderr, flush=True)
+
+
+def code_scope(data) -> str | None:
+    """Schema fingerprint that generated code depends on (None if it cannot be computed)."""
+    try:
+        return schema_fingerprint(data)
+    except Exception:
+        return None
+
+
+def _code_key(scope: str, query: str) -> str:
+    return _digest([scope, normalize_query(query)])
+
+
+def get_cached_code(scope: str | None, query: str) -> str | None:
+    """python_code that last answered this query for this schema."""
+    if scope is None:
+        return None
+    try:
+        entry = kv_get(CODE_NAMESPACE, _code_key(scope, query))
+    except Exception as e:
+        print(f"Code cache read failed: {e}", file=sys.stderr, flush=True)
+        entry = None
+    record_cache_access("analysis_code", entry is not None)
+    return entry["code"] if entry else None
+
+
+def find_similar_code(scope: str | None, query: str) -> str | None:
+    """python_code that answered a reworded form of query for this schema."""
+    if scope is None:
+        return None
+    try:
+        entry = _find_similar(CODE_NAMESPACE, scope, query)
+    except Exception as e:
+        print(f"Similar code lookup failed: {e}", file=sys.stderr, flush=True)
+        entry = None
+    record_cache_access("similar_code", entry is not None)
+    return entry["code"] if entry else None
+
+
+def put_cached_code(scope: str | None, query: str, code: str) -> None:
+    """Remember code that executed successfully."""
+    if scope is None:
+        return
+    try:
+        kv_put(
+            CODE_NAMESPACE,
+            _code_key(scope, query),
+            {"query": normalize_query(query), "scope": scope, "code": code},
+        )
+        kv_evict(CODE_NAMESPACE, CODE_MAX_ENTRIES)
+    except Exception as e:
+        print(f"Code cache write failed: {e}", file=sys.stderr, flush=True)
+
+
+def drop_cached_code(scope: str | None, query: str) -> None:
+    """Forget cached code that no longer runs."""
+    if scope is None:
+        return
+    try:
+        kv_delete(CODE_NAMESPACE, _code_key(scope, query))
+    except Exception as e:
+        print(f"Code cache delete failed: {e}", file=sys.stderr, flush=True)
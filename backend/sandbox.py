@@ -0,0 +1,397 @@
+"""Run LLM-generated analysis code in a pool of worker processes.
+
+Workers are started ahead of time (pandas/numpy already imported) and each run gets a
+wall-clock timeout and a memory limit, so runaway code cannot freeze the backend. A
+worker that times out or dies is killed and replaced in the background.
+
+Workers do not receive the dataset over the pipe: an in-memory DataFrame is written once
+per dataset version to an uncompressed Arrow IPC file. Each worker keeps it open as a
+memory map, shared through the OS page cache, and converts only the columns a run's code
+references into a DataFrame; chunk stores are opened from their directory.
+
+BACKEND_SANDBOX=0 runs generated code in the backend process instead.
+"""
+import os
+import sys
+import glob
+import queue
+import pickle
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+import pandas as pd
+import numpy as np
+from backend.storage import (
+    PARQUET_AVAILABLE,
+    get_data_dir,
+    write_arrow,
+    open_arrow,
+    arrow_columns,
+    arrow_to_frame,
+)
+from backend.state import (
+    get_dataframe,
+    get_dataset_id,
+    get_generation,
+    get_derived,
+    set_derived,
+)
+from backend.metadata import clean_numeric
+
+try:
+    import resource
+except ImportError:  # Windows: only the wall-clock limit applies.
+    resource = None
+
+SANDBOX_ENABLED = os.environ.get("BACKEND_SANDBOX", "1") != "0" and PARQUET_AVAILABLE
+
+# Worker processes kept ready (BACKEND_SANDBOX_WORKERS); by default one per slow-command
+# thread in main.py, so concurrent analyses never wait for each other's worker.
+SANDBOX_WORKERS = int(
+    os.environ.get("BACKEND_SANDBOX_WORKERS", os.environ.get("BACKEND_SLOW_WORKERS", "4"))
+)
+
+# Wall-clock limit per run of generated code (BACKEND_SANDBOX_TIMEOUT_SECONDS).
+SANDBOX_TIMEOUT_SECONDS = float(os.environ.get("BACKEND_SANDBOX_TIMEOUT_SECONDS", "60"))
+
+# Memory limit per worker process (BACKEND_SANDBOX_MEMORY_MB; 0 for none).
+SANDBOX_MEMORY_MB = int(os.environ.get("BACKEND_SANDBOX_MEMORY_MB", "4096"))
+
+# How long to wait for a worker to start (imports included).
+WORKER_START_SECONDS = 60
+
+
+# Builtins available to generated code.
+SAFE_BUILTINS = {
+    "len": len,
+    "sum": sum,
+    "min": min,
+    "max": max,
+    "sorted": sorted,
+    "round": round,
+    "abs": abs,
+    "range": range,
+    "enumerate": enumerate,
+    "list": list,
+    "dict": dict,
+    "set": set,
+    "tuple": tuple,
+    "float": float,
+    "int": int,
+    "str": str,
+    "bool": bool,
+}
+
+
+def build_scope(df, num, extras: dict) -> dict:
+    """Globals for generated code: the data, helpers, and a small set of safe builtins."""
+    scope = {
+        "df": df,
+        "num": num,
+        "pd": pd,
+        "np": np,
+        "datetime": datetime,
+        "timedelta": timedelta,
+    }
+    scope.update(extras)
+    scope["__builtins__"] = SAFE_BUILTINS
+    return scope
+
+
+def execute(code: str, scope: dict):
+    """Run validated code in scope and return the `result` it sets."""
+    scope.pop("result", None)
+    # IMPORTANT: use scope as BOTH globals and locals so that
+    # names like pd/np remain visible even if the code defines lambdas/functions.
+    exec(code, scope, scope)
+    if "result" not in scope:
+        raise RuntimeError("Generated code did not set `result`.")
+    return scope["result"]
+
+
+def _limit_memory(memory_mb: int) -> None:
+    if resource is None or memory_mb <= 0:
+        return
+    # RLIMIT_DATA on Linux does not count the read-only file mapping (only the frame built
+    # from it); elsewhere cap the whole address space.
+    kind = resource.RLIMIT_DATA if sys.platform.startswith("linux") else resource.RLIMIT_AS
+    limit = memory_mb * 1024 * 1024
+    try:
+        _, hard = resource.getrlimit(kind)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(kind, (limit, hard))
+    except (ValueError, OSError) as e:
+        print(f"Sandbox memory limit not applied: {e}", file=sys.stderr, flush=True)
+
+
+def _load(dataset: dict, code: str, tables: dict) -> pd.DataFrame:
+    """DataFrame for a task: the columns code references, from the mapped export (kept
+    open per path) or from a store."""
+    from backend.chunked_store import open_chunked_dataset, referenced_columns
+
+    if dataset["kind"] == "store":
+        store = open_chunked_dataset(dataset["path"])
+        if store is None:
+            raise RuntimeError("The dataset is no longer available. Please reload the file.")
+        # Same date conversion as the backend's own handle (not part of the manifest).
+        store.date_columns = dataset.get("date_columns", [])
+        return store.read(columns=referenced_columns(code, store.columns))
+    path = dataset["path"]
+    if path not in tables:
+        tables.clear()
+        tables[path] = open_arrow(path)
+    table = tables[path]
+    # A fresh DataFrame per run, so generated code may add or overwrite columns freely.
+    return arrow_to_frame(table, referenced_columns(code, arrow_columns(table)))
+
+
+def _run_task(task: dict, tables: dict):
+    df = _load(task["dataset"], task["code"], tables)
+    cleaned = {}
+
+    def num(column: str) -> pd.Series:
+        """Cleaned float values of a (possibly text) numeric column, aligned with df."""
+        if column not in cleaned:
+            cleaned[column] = clean_numeric(df[column])
+        return cleaned[column]
+
+    return execute(task["code"], build_scope(df, num, task["extras"]))
+
+
+def _send(conn, status: str, value) -> None:
+    """Send a reply; values that cannot be pickled are sent as text."""
+    try:
+        conn.send((status, value))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        if status == "error":
+            value = RuntimeError(f"{type(value).__name__}: {value}")
+        else:
+            value = str(value)
+        conn.send((status, value))
+
+
+def _worker_main(conn, memory_mb: int) -> None:
+    """Worker loop: receive a task, run it, send ("ok", result) or ("error", exception)."""
+    _limit_memory(memory_mb)
+    conn.send(("ready", os.getpid()))
+    tables: dict = {}
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+        try:
+            _send(conn, "ok", _run_task(task, tables))
+        except MemoryError:
+            tables.clear()
+            _send(conn, "error", MemoryError(
+                f"Generated code exceeded the {memory_mb} MB memory limit."
+            ))
+        except Exception as e:
+            _send(conn, "error", e)
+
+
+class SandboxUnavailable(RuntimeError):
+    """No worker could run the code; not a fault of the code itself."""
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child, SANDBOX_MEMORY_MB),
+            name="backend-sandbox",
+            daemon=True,
+        )
+        self.process.start()
+        child.close()
+
+    def wait_ready(self) -> None:
+        if not self.conn.poll(WORKER_START_SECONDS):
+            raise RuntimeError("sandbox worker did not start")
+        self.conn.recv()
+
+    def kill(self) -> None:
+        try:
+            self.process.kill()
+            self.process.join(5)
+        finally:
+            self.conn.close()
+
+
+class WorkerPool:
+    """Pre-started worker processes; each task runs on one idle worker."""
+
+    def __init__(self, size: int):
+        # spawn everywhere: no forking of a multi-threaded backend, same as on Windows.
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._size = size
+        self._failures = 0
+        self._closed = False
+        for _ in range(size):
+            self._replace()
+
+    def _spawn(self) -> None:
+        worker = None
+        try:
+            worker = _Worker(self._context)
+            worker.wait_ready()
+        except Exception as e:
+            if worker is not None:
+                worker.kill()
+            if self._closed:
+                return
+            self._failures += 1
+            print(f"Sandbox worker failed to start: {e}", file=sys.stderr, flush=True)
+            return
+        if self._closed:
+            worker.kill()
+            return
+        self._idle.put(worker)
+
+    def _replace(self) -> None:
+        """Start a worker in the background (callers never wait for process start-up)."""
+        threading.Thread(target=self._spawn, name="backend-sandbox-spawn", daemon=True).start()
+
+    @property
+    def broken(self) -> bool:
+        """True when no worker could ever be started (e.g. process creation is blocked)."""
+        return self._failures >= self._size and self._idle.empty()
+
+    def run(self, task: dict, timeout: float):
+        try:
+            # Busy workers free up within one run's timeout (or are replaced).
+            worker = self._idle.get(timeout=timeout + WORKER_START_SECONDS)
+        except queue.Empty:
+            raise SandboxUnavailable("No analysis worker is available. Please try again.") from None
+        try:
+            worker.conn.send(task)
+            if not worker.conn.poll(timeout):
+                raise TimeoutError(
+                    f"Generated code ran longer than {timeout:g} seconds and was stopped."
+                )
+            status, value = worker.conn.recv()
+        except TimeoutError:
+            worker.kill()
+            self._replace()
+            raise
+        except (EOFError, OSError, pickle.UnpicklingError):
+            code = worker.process.exitcode
+            worker.kill()
+            self._replace()
+            raise RuntimeError(
+                f"The analysis worker stopped unexpectedly (exit code {code})."
+            ) from None
+        if isinstance(value, MemoryError):
+            # The worker may be left fragmented; start a fresh one.
+            worker.kill()
+            self._replace()
+        else:
+            self._idle.put(worker)
+        if status == "error":
+            raise value
+        return value
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.kill()
+
+
+_pool: WorkerPool | None = None
+_pool_lock = threading.Lock()
+_export_lock = threading.Lock()
+
+# dataset id -> its current export file.
+_exports: dict[str, str] = {}
+
+
+def start_sandbox() -> None:
+    """Start the worker pool (no-op when disabled or already running)."""
+    global _pool
+    if not SANDBOX_ENABLED:
+        return
+    with _pool_lock:
+        if _pool is None:
+            # Exports from a previous run are never reused.
+            for path in glob.glob(os.path.join(get_data_dir("sandbox"), "*.arrow*")):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            _pool = WorkerPool(SANDBOX_WORKERS)
+
+
+def stop_sandbox() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def _export(df: pd.DataFrame) -> str | None:
+    """Arrow IPC file of the current DataFrame for workers, written once per version."""
+    if df is not get_dataframe():
+        return None
+    key = ("sandbox_export",)
+    # One writer at a time: concurrent requests on the same version share one file.
+    with _export_lock:
+        path = get_derived(df, key)
+        if path is not None and os.path.exists(path):
+            return path
+        dataset_id = get_dataset_id()
+        path = os.path.join(get_data_dir("sandbox"), f"{dataset_id}-{get_generation()}.arrow")
+        try:
+            write_arrow(df, path)
+        except Exception as e:
+            # E.g. object columns mixing types that Arrow cannot represent.
+            print(f"Sandbox export failed, running in-process: {e}", file=sys.stderr, flush=True)
+            return None
+        set_derived(df, key, path)
+        old = _exports.get(dataset_id)
+        _exports[dataset_id] = path
+    if old and old != path:
+        try:
+            os.remove(old)
+        except OSError:
+            pass  # Still mapped by a worker on Windows; cleared at next start.
+    return path
+
+
+def dataset_handle(data) -> dict | None:
+    """How workers find data (a DataFrame or ChunkedDataset); None to run in-process."""
+    if _pool is None or _pool.broken:
+        return None
+    if isinstance(data, pd.DataFrame):
+        path = _export(data)
+        return {"kind": "frame", "path": path} if path else None
+    return {"kind": "store", "path": data.path, "date_columns": list(data.date_columns)}
+
+
+def run_code(handle: dict, code: str, extras: dict):
+    """Run validated code on a worker and return its `result`.
+
+    extras are additional small, picklable globals (e.g. pre-aggregated totals).
+    Raises the code's own exception, TimeoutError, RuntimeError if the worker died, or
+    SandboxUnavailable if no worker could take the run.
+    """
+    pool = _pool
+    if pool is None:
+        raise SandboxUnavailable("The analysis sandbox is not running.")
+    return pool.run(
+        {"dataset": handle, "code": code, "extras": extras}, SANDBOX_TIMEOUT_SECONDS
+    )
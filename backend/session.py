@@ -0,0 +1,121 @@
+"""Crash-safe session checkpoints.
+
+After each state-changing command the active dataset (as Parquet, or a reference to its
+chunk store) and its metadata are written to the session directory. A respawned backend
+registers them on startup without reading the data; the DataFrame is loaded from disk the
+first time a command needs it, so recovery never requires re-uploading the CSV.
+"""
+import os
+import sys
+import json
+import glob
+from concurrent.futures import ThreadPoolExecutor
+from backend.storage import PARQUET_AVAILABLE, get_data_dir, write_frame
+from backend.state import get_active_entry, get_dataset_ids, mark_persisted, register_dataset
+from backend.chunked_store import open_chunked_dataset
+
+# Disable with BACKEND_SESSION=0.
+SESSION_ENABLED = PARQUET_AVAILABLE and os.environ.get("BACKEND_SESSION", "1") != "0"
+
+SESSION_FILE = "session.json"
+
+# A single worker keeps checkpoints ordered and off the request path.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backend-session")
+
+
+def _frame_path(session_dir: str, dataset_id: str) -> str:
+    return os.path.join(session_dir, f"{dataset_id}.parquet")
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+def checkpoint() -> None:
+    """Schedule a checkpoint of the active dataset; the write happens in the background."""
+    if SESSION_ENABLED:
+        _executor.submit(_write_checkpoint, get_active_entry())
+
+
+def _write_checkpoint(entry: dict) -> None:
+    try:
+        session_dir = get_data_dir("session")
+        session = {
+            "dataset_id": entry["id"],
+            "metadata": entry["metadata"],
+            "loaded_name": entry["loaded_name"],
+            "source": entry["source"],
+        }
+        frame_path = _frame_path(session_dir, entry["id"])
+        if entry["store"] is not None:
+            session["store"] = entry["store"].path
+            session["date_columns"] = entry["store"].date_columns
+        elif entry["spill_path"] == frame_path:
+            # Data unchanged since the last checkpoint: only the metadata is rewritten.
+            session["frame"] = os.path.basename(frame_path)
+        elif entry["df"] is not None:
+            write_frame(entry["df"], frame_path)
+            mark_persisted(entry["id"], entry["df"], frame_path)
+            session["frame"] = os.path.basename(frame_path)
+        else:
+            session = None
+
+        session_path = os.path.join(session_dir, SESSION_FILE)
+        if session is None:
+            if os.path.exists(session_path):
+                os.remove(session_path)
+        else:
+            # Written last: it only ever points at complete data files.
+            _write_json(session_path, session)
+
+        # Frames of datasets that no longer exist are not needed for recovery.
+        known = set(get_dataset_ids())
+        for path in glob.glob(os.path.join(session_dir, "*.parquet")):
+            if os.path.splitext(os.path.basename(path))[0] not in known:
+                os.remove(path)
+    except Exception as e:
+        print(f"Failed to checkpoint session: {e}", file=sys.stderr, flush=True)
+
+
+def restore_session() -> bool:
+    """Register the last checkpointed dataset as the active one. Returns whether one was found."""
+    if not SESSION_ENABLED:
+        return False
+    try:
+        session_dir = get_data_dir("session")
+        session_path = os.path.join(session_dir, SESSION_FILE)
+        if not os.path.exists(session_path):
+            return False
+        with open(session_path, "r", encoding="utf-8") as f:
+            session = json.load(f)
+
+        store = None
+        frame_path = None
+        if session.get("store"):
+            store = open_chunked_dataset(session["store"])
+            if store is None:
+                return False
+            store.date_columns = session.get("date_columns") or []
+        elif session.get("frame"):
+            frame_path = os.path.join(session_dir, session["frame"])
+            if not os.path.exists(frame_path):
+                return False
+        else:
+            return False
+
+        register_dataset(
+            session["dataset_id"],
+            spill_path=frame_path,
+            store=store,
+            metadata=session.get("metadata"),
+            loaded_name=session.get("loaded_name"),
+            source=session.get("source"),
+        )
+        print(f"Restored session dataset {session['dataset_id']}", file=sys.stderr, flush=True)
+        return True
+    except Exception as e:
+        print(f"Failed to restore session: {e}", file=sys.stderr, flush=True)
+        return False
@@ -0,0 +1,158 @@
+"""Offline similarity matching between analysis questions.
+
+Questions are compared as TF-IDF weighted character n-grams (cosine similarity), so
+reworded questions such as "revenue per driver last month" and "last month's revenue by
+driver" still match. Words are Unicode-aware, so Hebrew questions are compared too.
+Matches must also agree on numbers and on qualifier words (this vs last, top vs bottom,
+month vs year, in English and Hebrew) whose change alters the meaning of a question
+without changing much of its text.
+"""
+import os
+import re
+import math
+from collections import Counter
+import numpy as np
+
+# Minimum cosine similarity for reusing a cached result (BACKEND_SIMILARITY_THRESHOLD).
+SIMILARITY_THRESHOLD = float(os.environ.get("BACKEND_SIMILARITY_THRESHOLD", "0.75"))
+
+NGRAM_SIZES = (3, 4)
+
+# Unicode-aware: Hebrew (and other non-Latin) words count as words.
+_WORD_RE = re.compile(r"\w+")
+
+# Questions with fewer word characters than this are too short to match reliably.
+MIN_MATCH_CHARS = 12
+
+# Hebrew one-letter prefixes (the, in, to, and, that, from, as) glued to qualifier words.
+_HEBREW_PREFIXES = "הבלושמכ"
+
+# Function words that may differ between two wordings of the same question.
+STOPWORDS = frozenset({
+    "a", "an", "the", "of", "for", "by", "per", "in", "on", "at", "to", "from", "with",
+    "and", "s", "is", "are", "was", "were", "be", "do", "does", "did", "what", "which",
+    "how", "me", "my", "our", "we", "i", "you", "show", "give", "list", "tell", "get",
+    "find", "please", "there", "it", "its", "each", "every", "all",
+    # Hebrew
+    "של", "את", "מה", "על", "עם", "לפי", "לכל", "כל", "הוא", "היא", "הם", "הן", "יש",
+    "אני", "לי", "לנו", "תן", "תני", "תראה", "הראה", "הצג", "אנא", "בבקשה", "עבור", "פר",
+})
+
+# Words whose difference changes the answer even when the rest of a question matches.
+QUALIFIERS = {
+    "this": "this", "current": "this", "last": "last", "previous": "last", "prior": "last",
+    "ago": "last", "recent": "last",
+    "next": "next", "today": "today", "yesterday": "yesterday",
+    "day": "day", "daily": "day", "days": "day",
+    "week": "week", "weekly": "week", "weeks": "week",
+    "month": "month", "monthly": "month", "months": "month",
+    "quarter": "quarter", "quarterly": "quarter", "quarters": "quarter",
+    "year": "year", "yearly": "year", "annual": "year", "years": "year", "ytd": "ytd",
+    "top": "top", "highest": "top", "most": "top", "max": "top", "maximum": "top", "best": "top",
+    "bottom": "bottom", "lowest": "bottom", "least": "bottom", "min": "bottom",
+    "minimum": "bottom", "worst": "bottom",
+    "average": "average", "avg": "average", "mean": "average", "median": "median",
+    "count": "count", "number": "count", "many": "count",
+    "total": "total", "sum": "total",
+    "not": "not", "without": "not", "excluding": "not",
+    "increase": "increase", "growth": "increase", "decrease": "decrease", "decline": "decrease",
+    # Hebrew
+    "הזה": "this", "הזאת": "this", "נוכחי": "this", "נוכחית": "this",
+    "אחרון": "last", "אחרונה": "last", "אחרונים": "last", "אחרונות": "last",
+    "שעבר": "last", "שעברה": "last", "קודם": "last", "קודמת": "last",
+    "הבא": "next", "הבאה": "next", "היום": "today", "אתמול": "yesterday",
+    "יום": "day", "ימים": "day", "יומי": "day", "יומית": "day",
+    "שבוע": "week", "שבועות": "week", "שבועי": "week", "שבועית": "week",
+    "חודש": "month", "חודשים": "month", "חודשי": "month", "חודשית": "month",
+    "רבעון": "quarter", "רבעונים": "quarter", "רבעוני": "quarter",
+    "שנה": "year", "שנים": "year", "שנתי": "year", "שנתית": "year",
+    "גבוה": "top", "גבוהה": "top", "מקסימום": "top", "מקסימלי": "top", "ביותר": "top",
+    "נמוך": "bottom", "נמוכה": "bottom", "מינימום": "bottom", "מינימלי": "bottom",
+    "ממוצע": "average", "ממוצעת": "average", "חציון": "median",
+    "כמה": "count", "מספר": "count", "כמות": "count",
+    "סך": "total", "סה": "total", "סכום": "total", "כולל": "total", "כוללת": "total",
+    "לא": "not", "ללא": "not", "בלי": "not", "למעט": "not", "חוץ": "not",
+    "עלייה": "increase", "גידול": "increase", "צמיחה": "increase",
+    "ירידה": "decrease", "קיטון": "decrease",
+}
+
+
+# Qualifier classes that make a question's answer depend on today's date.
+RELATIVE_DATE_QUALIFIERS = frozenset({"this", "last", "next", "today", "yesterday", "ytd"})
+
+
+def _ngrams(text: str) -> Counter:
+    """Character n-grams of each word, padded with spaces at word boundaries."""
+    grams = Counter()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            grams.update(padded[i:i + n] for i in range(max(len(padded) - n + 1, 1)))
+    return grams
+
+
+def _qualifier(word: str) -> str | None:
+    """Qualifier class of a word, looking through up to two Hebrew prefix letters."""
+    for _ in range(3):
+        if word in QUALIFIERS:
+            return QUALIFIERS[word]
+        if len(word) < 3 or word[0] not in _HEBREW_PREFIXES:
+            return None
+        word = word[1:]
+    return None
+
+
+def _term(word: str) -> str:
+    """Content word with an English plural -s removed ("drivers" and "driver" agree)."""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss") and word.isascii():
+        return word[:-1]
+    return word
+
+
+def _signature(text: str) -> tuple[tuple, frozenset]:
+    """Content words (in order) and qualifier classes of a question."""
+    terms, qualifiers = [], set()
+    for word in _WORD_RE.findall(text.lower()):
+        qualifier = _qualifier(word)
+        if qualifier is not None:
+            qualifiers.add(qualifier)
+        elif word not in STOPWORDS:
+            terms.append(_term(word))
+    return tuple(terms), frozenset(qualifiers)
+
+
+def is_relative_date(text: str) -> bool:
+    """Whether a question is relative to today ("last month", "this week", "ytd")."""
+    return not RELATIVE_DATE_QUALIFIERS.isdisjoint(_signature(text)[1])
+
+
+def best_match(query: str, candidates: list[str]) -> tuple[int | None, float]:
+    """(index, similarity) of the candidate closest to query, or (None, 0.0).
+
+    Candidates whose content words (in order) or qualifiers differ from the query are
+    never returned, and very short queries (under MIN_MATCH_CHARS word characters) never
+    match.
+    """
+    if sum(len(w) for w in _WORD_RE.findall(query)) < MIN_MATCH_CHARS:
+        return None, 0.0
+    signature = _signature(query)
+    eligible = [i for i, text in enumerate(candidates) if _signature(text) == signature]
+    if not eligible:
+        return None, 0.0
+    documents = [_ngrams(query)] + [_ngrams(candidates[i]) for i in eligible]
+    vocabulary = {gram: j for j, gram in enumerate(set().union(*documents))}
+    if not vocabulary:
+        return None, 0.0
+    matrix = np.zeros((len(documents), len(vocabulary)))
+    for row, grams in enumerate(documents):
+        for gram, count in grams.items():
+            matrix[row, vocabulary[gram]] = 1 + math.log(count)
+    # Smoothed inverse document frequency over the query and its candidates.
+    frequency = np.count_nonzero(matrix, axis=0)
+    matrix *= np.log((1 + len(documents)) / (1 + frequency)) + 1
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    matrix /= norms[:, None]
+    scores = matrix[1:] @ matrix[0]
+    best = int(np.argmax(scores))
+    return eligible[best], float(scores[best])
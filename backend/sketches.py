@@ -0,0 +1,188 @@
+"""Mergeable sketches for approximate statistics on very large datasets.
+
+HyperLogLog estimates distinct counts and a DDSketch-style log-bucket histogram
+estimates quantiles (median, percentiles). Both are updated a whole column (or chunk) at
+a time with numpy, merge across chunks, and serialise to JSON-friendly dicts so chunk
+stores can keep them in their manifest.
+"""
+import os
+import math
+import base64
+import numpy as np
+import pandas as pd
+
+# Build sketches while ingesting chunk stores (BACKEND_SKETCHES=0 to disable).
+SKETCHES_ENABLED = os.environ.get("BACKEND_SKETCHES", "1") != "0"
+
+# HyperLogLog precision: 2**14 registers, about 0.8% standard error.
+HLL_PRECISION = 14
+
+# Quantile sketch relative accuracy.
+QUANTILE_ALPHA = 0.01
+
+
+class HyperLogLog:
+    """Distinct-count sketch over 64-bit value hashes."""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: np.ndarray | None = None):
+        self.precision = precision
+        self.registers = (
+            registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+        )
+
+    @property
+    def relative_error(self) -> float:
+        """Standard error of the estimate, relative to the true count."""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def update(self, values: pd.Series) -> None:
+        values = values.dropna()
+        if len(values) == 0:
+            return
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        # Rank = position of the first set bit in the remaining 64-p bits (a sentinel bit
+        # caps it); frexp gives the bit length without a Python-level loop.
+        rest = (hashes << np.uint64(p)) | np.uint64(1 << (p - 1))
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = (65 - bit_length).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.exp2(-self.registers.astype(np.float64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Small-range correction (linear counting).
+            return m * math.log(m / zeros)
+        return raw
+
+    def to_dict(self) -> dict:
+        return {
+            "precision": self.precision,
+            "registers": base64.b64encode(self.registers.tobytes()).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        registers = np.frombuffer(base64.b64decode(data["registers"]), dtype=np.uint8).copy()
+        return cls(data["precision"], registers)
+
+
+class QuantileSketch:
+    """Log-bucket quantile sketch (DDSketch) with a relative accuracy guarantee."""
+
+    def __init__(self, alpha: float = QUANTILE_ALPHA):
+        self.alpha = alpha
+        self._log_gamma = math.log((1 + alpha) / (1 - alpha))
+        self.positive: dict[int, int] = {}
+        self.negative: dict[int, int] = {}
+        self.zero = 0
+
+    @property
+    def relative_error(self) -> float:
+        """Maximum error of a quantile estimate, relative to the true value."""
+        return self.alpha
+
+    @property
+    def count(self) -> int:
+        return self.zero + sum(self.positive.values()) + sum(self.negative.values())
+
+    def _add(self, store: dict[int, int], magnitudes: np.ndarray) -> None:
+        keys = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+        unique, counts = np.unique(keys, return_counts=True)
+        for key, count in zip(unique.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def update(self, values: pd.Series) -> None:
+        array = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        array = array[np.isfinite(array)]
+        self.zero += int(np.count_nonzero(array == 0))
+        if np.any(array > 0):
+            self._add(self.positive, array[array > 0])
+        if np.any(array < 0):
+            self._add(self.negative, -array[array < 0])
+
+    def merge(self, other: "QuantileSketch") -> None:
+        self.zero += other.zero
+        for target, source in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in source.items():
+                target[key] = target.get(key, 0) + count
+
+    def _value(self, key: int) -> float:
+        return 2 * math.exp(key * self._log_gamma) / (1 + math.exp(self._log_gamma))
+
+    def quantile(self, q: float) -> float | None:
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        # Ascending order: most negative first, then zeros, then positives.
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive)) if self.positive else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "alpha": self.alpha,
+            "positive": {str(k): v for k, v in self.positive.items()},
+            "negative": {str(k): v for k, v in self.negative.items()},
+            "zero": self.zero,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data["alpha"])
+        sketch.positive = {int(k): v for k, v in data["positive"].items()}
+        sketch.negative = {int(k): v for k, v in data["negative"].items()}
+        sketch.zero = data["zero"]
+        return sketch
+
+
+def build_column_sketches(col: pd.Series, numeric: pd.Series | None = None) -> dict:
+    """Distinct-count sketch of col, and a quantile sketch of its numeric values if any."""
+    hll = HyperLogLog()
+    hll.update(col)
+    sketches = {"distinct": hll}
+    if numeric is not None:
+        quantiles = QuantileSketch()
+        quantiles.update(numeric)
+        sketches["quantiles"] = quantiles
+    return sketches
+
+
+def merge_column_sketches(target: dict, source: dict) -> None:
+    """Fold one chunk's column sketches into the running ones (in place)."""
+    for name, sketch in source.items():
+        if name in target:
+            target[name].merge(sketch)
+        else:
+            target[name] = sketch
+
+
+def sketches_to_dict(sketches: dict) -> dict:
+    return {name: sketch.to_dict() for name, sketch in sketches.items()}
+
+
+def sketches_from_dict(data: dict) -> dict:
+    sketches = {}
+    if "distinct" in data:
+        sketches["distinct"] = HyperLogLog.from_dict(data["distinct"])
+    if "quantiles" in data:
+        sketches["quantiles"] = QuantileSketch.from_dict(data["quantiles"])
+    return sketches
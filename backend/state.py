@@ -1,31 +1,464 @@
-"""Application state management."""
+"""Application state management.
+
+Several datasets can be loaded at once; each lives in a registry entry keyed by dataset
+id, and STATE is always the entry of the active dataset. Commands run inside
+dataset_scope, which binds the entry they work on to the calling thread for the whole
+request, so switching or loading another dataset concurrently never changes what an
+in-flight request reads. Outside a scope the accessors use the active entry.
+
+Entries are kept in LRU order:
+when in-memory DataFrames exceed MEMORY_BUDGET_BYTES, the least recently used inactive
+ones are spilled to disk (or dropped if spilling is unavailable) and reloaded on demand.
+"""
+import os
+import re
+import sys
+import copy
+import itertools
+import threading
+import contextlib
 import pandas as pd
+from collections import OrderedDict
 from typing import Optional
+from backend.storage import PARQUET_AVAILABLE, get_data_dir, write_frame, read_frame
+
+DEFAULT_DATASET_ID = "default"
+
+# Dataset ids come from the frontend and name files on disk (spill, session, sandbox).
+_DATASET_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# Deep memory allowed for in-memory DataFrames across all datasets (BACKEND_MEMORY_BUDGET_MB).
+MEMORY_BUDGET_BYTES = int(os.environ.get("BACKEND_MEMORY_BUDGET_MB", "4096")) * 1024 * 1024
+
+
+# Source of dataset generations: every change to a dataset's data or metadata gives it a
+# new, never reused number, and memoised results are only valid for the one they saw.
+_generations = itertools.count(1)
+
+
+def _new_entry(dataset_id: str) -> dict:
+    if not isinstance(dataset_id, str) or not _DATASET_ID_RE.fullmatch(dataset_id):
+        raise ValueError(
+            f"Invalid dataset id: {dataset_id!r}. "
+            "Use up to 64 letters, digits, '_' or '-'."
+        )
+    return {
+        "id": dataset_id,
+        "df": None,
+        "store": None,
+        "metadata": None,
+        "loaded_name": None,
+        # Raw-file fingerprint of the in-memory dataset ({"size", "hash", "encoding"}),
+        # used by append_csv to recognise a grown version of the same file.
+        "source": None,
+        # Deep memory usage of df, and a Parquet copy of it on disk (None while there is
+        # none). spill_owned is False when the file belongs to someone else (the session
+        # checkpoint) and must not be deleted along with the entry.
+        "memory_bytes": 0,
+        "spill_path": None,
+        "spill_owned": True,
+        # Values computed from df (e.g. cleaned numeric columns), dropped whenever df changes.
+        "derived": {},
+        # Results memoised against the current generation (see memoize).
+        "generation": next(_generations),
+        "memo": {},
+    }
+
+
+DATASETS: "OrderedDict[str, dict]" = OrderedDict()
+STATE = _new_entry(DEFAULT_DATASET_ID)
+DATASETS[DEFAULT_DATASET_ID] = STATE
+
+_lock = threading.RLock()
+
+# Entry bound to the current thread by dataset_scope.
+_local = threading.local()
+
+# id(entry) -> number of requests currently bound to it (never spilled while in use).
+_in_use: dict[int, int] = {}
 
-STATE = {
-    "df": None,
-    "metadata": None,
-    "loaded_name": None,
-}
+# id(entry) of entries whose spill file is being written.
+_spilling: set[int] = set()
+
+# name -> {"hits", "misses"} for memoize and the derived-value cache.
+CACHE_STATS: dict[str, dict[str, int]] = {}
+
+def _current() -> dict:
+    """Entry of the current request (see dataset_scope), else the active entry."""
+    return getattr(_local, "entry", None) or STATE
+
+@contextlib.contextmanager
+def dataset_scope(dataset_id: Optional[str] = None, create: bool = False):
+    """Bind a dataset entry to this thread for the duration of a request.
+
+    dataset_id None means the dataset active when the scope starts. With create=True an
+    empty entry is registered for an unknown id (loading into a new dataset); otherwise
+    an unknown id is an error.
+    """
+    with _lock:
+        if dataset_id is None:
+            entry = STATE
+        elif dataset_id in DATASETS:
+            entry = DATASETS[dataset_id]
+        elif create:
+            entry = DATASETS[dataset_id] = _new_entry(dataset_id)
+        else:
+            raise ValueError(f"Unknown dataset: {dataset_id}. Please load the file again.")
+        _in_use[id(entry)] = _in_use.get(id(entry), 0) + 1
+    previous = getattr(_local, "entry", None)
+    _local.entry = entry
+    try:
+        yield entry
+    finally:
+        _local.entry = previous
+        with _lock:
+            _in_use[id(entry)] -= 1
+            if not _in_use[id(entry)]:
+                del _in_use[id(entry)]
 
 def get_dataframe() -> Optional[pd.DataFrame]:
-    """Get the current dataframe."""
-    return STATE["df"]
+    """Get the current dataframe (reloading it if it was spilled to disk)."""
+    entry = _current()
+    _restore(entry)
+    with _lock:
+        return entry["df"]
 
 def set_dataframe(df: pd.DataFrame) -> None:
     """Set the current dataframe."""
-    STATE["df"] = df
+    entry = _current()
+    with _lock:
+        entry["df"] = df
+        entry["store"] = None
+        entry["derived"] = {}
+        _bump_generation(entry)
+        entry["memory_bytes"] = int(df.memory_usage(deep=True).sum()) if df is not None else 0
+        _discard_spill(entry)
+        if DATASETS.get(entry["id"]) is entry:
+            DATASETS.move_to_end(entry["id"])
+    _enforce_budget()
+
+def _is_active_data(data) -> bool:
+    entry = _current()
+    return data is not None and (data is entry["df"] or data is entry["store"])
+
+def get_derived(data, key):
+    """Cached value derived from data (the active DataFrame or chunk store), or None if
+    absent or data is no longer the active dataset."""
+    if not _is_active_data(data):
+        return None
+    value = _current()["derived"].get(key)
+    record_cache_access("derived", value is not None)
+    return value
+
+def set_derived(data, key, value) -> None:
+    """Cache a value derived from data (ignored unless data is the active dataset)."""
+    with _lock:
+        if _is_active_data(data):
+            _current()["derived"][key] = value
+
+def get_generation() -> int:
+    """Generation of the current dataset; changes whenever its data or metadata does."""
+    return _current()["generation"]
+
+def memoize(name: str, compute, *key):
+    """compute(), cached for the active dataset until its generation changes.
+
+    key distinguishes calls whose result depends on more than the dataset (e.g. the
+    report period). Callers get a copy, so they may modify the result freely.
+    """
+    entry = _current()
+    generation = entry["generation"]
+    memo_key = (name,) + key
+    value = entry["memo"].get(memo_key)
+    record_cache_access(name, value is not None)
+    if value is None:
+        value = compute()
+        with _lock:
+            # Do not cache a result computed while the dataset changed underneath us.
+            if entry["generation"] == generation:
+                entry["memo"][memo_key] = value
+    return copy.deepcopy(value)
+
+def get_cache_stats() -> dict:
+    """Hit/miss counts and hit rate per in-process cache."""
+    with _lock:
+        caches = {}
+        for name, counts in CACHE_STATS.items():
+            total = counts["hits"] + counts["misses"]
+            caches[name] = {**counts, "hit_rate": counts["hits"] / total if total else 0.0}
+        return {"generation": _current()["generation"], "caches": caches}
+
+def record_cache_access(name: str, hit: bool) -> None:
+    """Count a hit or miss for the named cache (reported by get_cache_stats)."""
+    with _lock:
+        counts = CACHE_STATS.setdefault(name, {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
+
+def _bump_generation(entry: dict) -> None:
+    entry["generation"] = next(_generations)
+    entry["memo"] = {}
+
+def get_store():
+    """Get the current out-of-core dataset handle (ChunkedDataset), if any."""
+    return _current()["store"]
+
+def set_store(store) -> None:
+    """Set an out-of-core dataset as the current dataset (replaces any dataframe)."""
+    entry = _current()
+    with _lock:
+        entry["store"] = store
+        entry["df"] = None
+        entry["derived"] = {}
+        _bump_generation(entry)
+        entry["source"] = None
+        entry["memory_bytes"] = 0
+        _discard_spill(entry)
+
+def get_store_paths() -> set[str]:
+    """Directories of the chunk stores of all registered datasets."""
+    with _lock:
+        return {entry["store"].path for entry in DATASETS.values() if entry["store"] is not None}
+
+def has_dataset() -> bool:
+    """Whether a dataset is loaded, in memory or out-of-core."""
+    entry = _current()
+    return entry["df"] is not None or entry["store"] is not None or bool(entry["spill_path"])
 
 def get_metadata() -> Optional[dict]:
     """Get the current metadata."""
-    return STATE["metadata"]
+    return _current()["metadata"]
 
 def set_metadata(metadata: dict) -> None:
     """Set the current metadata."""
-    STATE["metadata"] = metadata
+    entry = _current()
+    with _lock:
+        entry["metadata"] = metadata
+        _bump_generation(entry)
+
+def get_loaded_name() -> Optional[str]:
+    """Get the name of the currently loaded file, if known."""
+    return _current()["loaded_name"]
+
+def set_loaded_name(name: Optional[str]) -> None:
+    """Set the name of the currently loaded file."""
+    _current()["loaded_name"] = name
+
+def get_source() -> Optional[dict]:
+    """Get the raw-file fingerprint of the current dataset."""
+    return _current()["source"]
+
+def set_source(source: Optional[dict]) -> None:
+    """Set the raw-file fingerprint of the current dataset."""
+    _current()["source"] = source
 
 def clear_state() -> None:
-    """Clear all state."""
-    STATE["df"] = None
-    STATE["metadata"] = None
-    STATE["loaded_name"] = None
+    """Clear all state of the current dataset."""
+    entry = _current()
+    with _lock:
+        _discard_spill(entry)
+        entry.update(_new_entry(entry["id"]))
+
+def get_active_dataset_id() -> str:
+    """Id of the active dataset."""
+    return STATE["id"]
+
+def get_dataset_id() -> str:
+    """Id of the current request's dataset (the active one outside dataset_scope)."""
+    return _current()["id"]
+
+def use_dataset(dataset_id: Optional[str]) -> None:
+    """Make dataset_id the active dataset, creating an empty entry if it is new.
+
+    Requests already running keep the dataset bound by their dataset_scope.
+    """
+    global STATE
+    dataset_id = dataset_id or DEFAULT_DATASET_ID
+    with _lock:
+        if dataset_id not in DATASETS:
+            DATASETS[dataset_id] = _new_entry(dataset_id)
+        STATE = DATASETS[dataset_id]
+        DATASETS.move_to_end(dataset_id)
+
+def select_dataset(dataset_id: str) -> None:
+    """Switch to an already loaded dataset, restoring it from disk if it was spilled."""
+    with _lock:
+        if dataset_id not in DATASETS:
+            raise ValueError(f"Unknown dataset: {dataset_id}. Please load the file again.")
+        use_dataset(dataset_id)
+        entry = DATASETS[dataset_id]
+    _restore(entry)
+
+def drop_dataset(dataset_id: str) -> None:
+    """Forget a dataset; dropping the active one switches to the default dataset."""
+    with _lock:
+        entry = DATASETS.pop(dataset_id, None)
+        if entry is None:
+            return
+        _discard_spill(entry)
+        if entry is STATE:
+            use_dataset(DEFAULT_DATASET_ID)
+
+def list_datasets() -> list[dict]:
+    """Summaries of all registered datasets, most recently used last."""
+    with _lock:
+        summaries = []
+        for entry in DATASETS.values():
+            df, store = entry["df"], entry["store"]
+            if df is None and store is None and not entry["spill_path"]:
+                continue
+            summaries.append(
+                {
+                    "dataset_id": entry["id"],
+                    "name": entry["loaded_name"],
+                    "active": entry is STATE,
+                    "in_memory": df is not None,
+                    "chunked": store is not None,
+                    "memory_bytes": entry["memory_bytes"],
+                    "has_metadata": entry["metadata"] is not None,
+                }
+            )
+        return summaries
+
+def memory_in_use() -> int:
+    """Deep memory of all in-memory DataFrames."""
+    return sum(entry["memory_bytes"] for entry in DATASETS.values() if entry["df"] is not None)
+
+def get_active_entry() -> dict:
+    """Snapshot of the current dataset's entry; its metadata and source are copies, so
+    later changes to the entry do not show through (DataFrames are replaced, not mutated)."""
+    with _lock:
+        snapshot = dict(_current())
+        snapshot["metadata"] = copy.deepcopy(snapshot["metadata"])
+        snapshot["source"] = copy.deepcopy(snapshot["source"])
+        return snapshot
+
+def get_dataset_ids() -> list[str]:
+    """Ids of all registered datasets."""
+    with _lock:
+        return list(DATASETS)
+
+def mark_persisted(dataset_id: str, df: pd.DataFrame, path: str) -> None:
+    """Record that df was written to path by someone else; it doubles as the spill copy."""
+    with _lock:
+        entry = DATASETS.get(dataset_id)
+        if entry is None or entry["df"] is not df:
+            return
+        _discard_spill(entry)
+        entry["spill_path"] = path
+        entry["spill_owned"] = False
+
+def register_dataset(
+    dataset_id: str,
+    *,
+    spill_path: Optional[str] = None,
+    store=None,
+    metadata: Optional[dict] = None,
+    loaded_name: Optional[str] = None,
+    source: Optional[dict] = None,
+) -> None:
+    """Register a dataset that is on disk (not yet in memory) and make it active."""
+    with _lock:
+        use_dataset(dataset_id)
+        DATASETS[dataset_id].update(
+            spill_path=spill_path,
+            spill_owned=False,
+            store=store,
+            metadata=metadata,
+            loaded_name=loaded_name,
+            source=source,
+        )
+
+def _spill_path(entry: dict) -> str:
+    return os.path.join(get_data_dir("spill"), f"{entry['id']}.parquet")
+
+def _discard_spill(entry: dict) -> None:
+    """Delete an entry's spill file (its DataFrame changed or it is going away)."""
+    path = entry["spill_path"]
+    entry["spill_path"] = None
+    if path and entry["spill_owned"] and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _restore(entry: dict) -> None:
+    """Load a spilled DataFrame back into memory, then re-check the budget.
+
+    The file is read without holding the lock, so other requests are not stalled.
+    """
+    with _lock:
+        path = entry["spill_path"]
+        if entry["df"] is not None or not path:
+            return
+    try:
+        df = read_frame(path)
+    except Exception as e:
+        print(f"Failed to reload dataset {entry['id']}: {e}", file=sys.stderr, flush=True)
+        with _lock:
+            if entry["spill_path"] == path:
+                entry["spill_path"] = None
+        return
+    with _lock:
+        if entry["df"] is not None or entry["spill_path"] != path:
+            return  # Replaced or reloaded meanwhile.
+        entry["df"] = df
+        entry["memory_bytes"] = int(df.memory_usage(deep=True).sum())
+    _enforce_budget()
+
+def _evict(entry: dict) -> None:
+    entry["df"] = None
+    entry["derived"] = {}
+
+def _enforce_budget() -> None:
+    """Spill least recently used DataFrames that no request is using until the budget is met.
+
+    Spill files are written without holding the lock. An entry whose spill fails stays in
+    memory; only without Parquet support are DataFrames dropped outright (they must then
+    be re-uploaded).
+    """
+    failed: set[int] = set()
+    while True:
+        with _lock:
+            if memory_in_use() <= MEMORY_BUDGET_BYTES:
+                return
+            entry = next(
+                (
+                    e for e in DATASETS.values()
+                    if e is not STATE
+                    and e["df"] is not None
+                    and id(e) not in _in_use
+                    and id(e) not in _spilling
+                    and id(e) not in failed
+                ),
+                None,
+            )
+            if entry is None:
+                return
+            if entry["spill_path"] or not PARQUET_AVAILABLE:
+                _evict(entry)
+                continue
+            df, path = entry["df"], _spill_path(entry)
+            _spilling.add(id(entry))
+        try:
+            write_frame(df, path)
+            written = True
+        except Exception as e:
+            print(f"Failed to spill dataset {entry['id']}: {e}", file=sys.stderr, flush=True)
+            written = False
+        with _lock:
+            _spilling.discard(id(entry))
+            if not written:
+                failed.add(id(entry))
+                continue
+            if entry["df"] is df and DATASETS.get(entry["id"]) is entry:
+                entry["spill_path"] = path
+                entry["spill_owned"] = True
+                # It may have become active or in use while the file was written.
+                if entry is not STATE and id(entry) not in _in_use:
+                    _evict(entry)
+                continue
+            # The entry changed or was dropped while its file was written.
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,87 @@
+"""Local on-disk storage: data directory location and DataFrame serialisation."""
+import os
+import sys
+import threading
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (parquet engine for pandas)
+    PARQUET_AVAILABLE = True
+except ImportError:
+    print("Warning: pyarrow not installed; on-disk dataset storage is disabled.", file=sys.stderr)
+    PARQUET_AVAILABLE = False
+
+# Same identifier Tauri uses for the app's own data directory (see tauri.conf.json).
+APP_IDENTIFIER = "com.eternity-ai.app"
+
+
+def _default_base_dir() -> str:
+    """Per-user, per-machine data directory for the current platform."""
+    if sys.platform == "win32":
+        root = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        root = os.path.expanduser("~/Library/Application Support")
+    else:
+        root = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(root, APP_IDENTIFIER, "backend")
+
+
+def get_data_dir(*parts: str) -> str:
+    """Return (and create) a backend data directory; BACKEND_DATA_DIR overrides the base."""
+    base = os.environ.get("BACKEND_DATA_DIR") or _default_base_dir()
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def write_frame(df: pd.DataFrame, path: str) -> None:
+    """Write a DataFrame as Parquet atomically (readers never see a partial file)."""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("pyarrow is required for on-disk dataset storage.")
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def read_frame(path: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """Read a DataFrame written by write_frame, optionally only some columns."""
+    return pd.read_parquet(path, columns=columns)
+
+
+def write_arrow(df: pd.DataFrame, path: str) -> None:
+    """Write a DataFrame (with its index) as an uncompressed Arrow IPC file, atomically."""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("pyarrow is required for on-disk dataset storage.")
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    # Unique temporary name: concurrent writers of the same path never share one.
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def open_arrow(path: str):
+    """Memory-mapped pyarrow Table of a file written by write_arrow (nothing is copied)."""
+    import pyarrow as pa
+
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _arrow_index_columns(table) -> list[str]:
+    metadata = table.schema.pandas_metadata or {}
+    return [col for col in metadata.get("index_columns", []) if isinstance(col, str)]
+
+
+def arrow_columns(table) -> list[str]:
+    """Data columns of a table from open_arrow (without the stored index)."""
+    index = set(_arrow_index_columns(table))
+    return [col for col in table.column_names if col not in index]
+
+
+def arrow_to_frame(table, columns: list[str] | None = None) -> pd.DataFrame:
+    """DataFrame of a table from open_arrow; only the given columns are converted."""
+    if columns is not None:
+        table = table.select(list(columns) + _arrow_index_columns(table))
+    return table.to_pandas()
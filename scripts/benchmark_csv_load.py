@@ -0,0 +1,100 @@
+"""Benchmark CSV loading throughput (rows/second) on a generated, clean CSV file.
+
+Usage (from the repo root, with the backend venv active):
+
+    python scripts/benchmark_csv_load.py [--rows 500000] [--repeat 3]
+
+Reports the baseline python-engine parse next to backend.csv_handler's loader so the
+gain from each loader change can be compared on the same input.
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep benchmark cache entries out of the user's real data directory.
+os.environ.setdefault("BACKEND_DATA_DIR", tempfile.mkdtemp(prefix="csv-bench-"))
+
+from backend import csv_handler  # noqa: E402
+
+
+def make_csv(rows: int, seed: int = 0) -> bytes:
+    """Generate a sales-export-like CSV with dates, money strings, Hebrew text and ids."""
+    rng = np.random.default_rng(seed)
+    reps = np.array(["דני", "רונית", "Alice", "Bob", "משה", "Carol"])
+    cities = np.array(["תל אביב", "חיפה", "ירושלים", "Haifa", "Eilat"])
+    df = pd.DataFrame(
+        {
+            "order_id": np.arange(rows),
+            "order_date": pd.Timestamp("2024-01-01")
+            + pd.to_timedelta(rng.integers(0, 700, rows), unit="D"),
+            "rep": reps[rng.integers(0, len(reps), rows)],
+            "city": cities[rng.integers(0, len(cities), rows)],
+            "amount": [f"₪{v:,.2f}" for v in rng.uniform(10, 5000, rows)],
+            "quantity": rng.integers(1, 50, rows),
+            "discount": rng.uniform(0, 0.3, rows).round(3),
+        }
+    )
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def _time(fn, repeat: int) -> float:
+    """Best wall-clock time of fn over repeat runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _serial(fn, *args):
+    """Call fn with parallel parsing disabled."""
+    workers = csv_handler.PARSE_WORKERS
+    csv_handler.PARSE_WORKERS = 1
+    try:
+        return fn(*args)
+    finally:
+        csv_handler.PARSE_WORKERS = workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None, help="parallel parse threads")
+    args = parser.parse_args()
+    if args.workers:
+        csv_handler.PARSE_WORKERS = args.workers
+
+    raw = make_csv(args.rows)
+    print(f"rows={args.rows:,} size={len(raw) / 1e6:.1f} MB")
+
+    cases = {
+        "python engine (baseline)": lambda: pd.read_csv(
+            io.BytesIO(raw), engine="python", on_bad_lines="skip", encoding="utf-8"
+        ),
+        "parse_csv_bytes (serial)": lambda: _serial(csv_handler.parse_csv_bytes, raw),
+        f"parse_csv_bytes ({csv_handler.PARSE_WORKERS} workers)": lambda: csv_handler.parse_csv_bytes(raw),
+        "load_csv_bytes (cache hit)": lambda: csv_handler.load_csv_bytes(raw),
+    }
+    # Prime the dataset cache so the last case measures a repeat load.
+    csv_handler.load_csv_bytes(raw)
+
+    baseline = None
+    for label, fn in cases.items():
+        seconds = _time(fn, args.repeat)
+        rate = args.rows / seconds
+        baseline = baseline or rate
+        print(f"{label:<32} {seconds:8.3f} s {rate:14,.0f} rows/s  x{rate / baseline:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,7 +17,7 @@ if not exist "backend\.venv\Scripts\activate.bat" (
 )
 
 call "backend\.venv\Scripts\activate.bat" || goto :fail
-python -m PyInstaller --onefile --name backend --clean --hidden-import=backend --hidden-import=backend.state --hidden-import=backend.llm --hidden-import=backend.csv_handler --hidden-import=backend.metadata --hidden-import=backend.analysis --hidden-import=backend.commands backend\main.py || goto :fail
+python -m PyInstaller --onefile --name backend --clean --hidden-import=backend --hidden-import=backend.state --hidden-import=backend.storage --hidden-import=backend.dataset_cache --hidden-import=backend.chunked_store --hidden-import=backend.dtype_optimizer --hidden-import=backend.session --hidden-import=backend.aggregates --hidden-import=backend.profiling --hidden-import=backend.sketches --hidden-import=backend.kvstore --hidden-import=backend.query_cache --hidden-import=backend.similarity --hidden-import=backend.sandbox --hidden-import=backend.code_optimizer --hidden-import=backend.llm --hidden-import=backend.csv_handler --hidden-import=backend.metadata --hidden-import=backend.analysis --hidden-import=backend.commands backend\main.py || goto :fail
 
 mkdir "src-tauri\bin" 2>nul
 copy /y "dist\backend.exe" "src-tauri\bin\backend-x86_64-pc-windows-msvc.exe" || goto :fail